@@ -1,8 +1,34 @@
+import ipaddress
 import os
+import random
+import re
+import threading
+import time
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from requests.adapters import HTTPAdapter
 from akamai.edgegrid import EdgeGridAuth
 
+# Seconds a cached network list stays fresh before it is revalidated with its ETag
+DEFAULT_CACHE_TTL = 300
+# Upper bound on pages fetched when listing network lists
+MAX_PAGES = 100
+# Elements sent per append/update request in bulk operations
+DEFAULT_BULK_BATCH_SIZE = 1000
+INDICATOR_PAGE_SIZE = 1000
+# Concurrent requests and pooled connections used by the request engine
+DEFAULT_MAX_WORKERS = 8
+# Retries for rate-limited, server-error and connection-failed requests
+DEFAULT_MAX_RETRIES = 5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Base and cap, in seconds, of the jittered exponential backoff
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30
+
 class AkamaiIntegration:
     def __init__(self, params):
         self.server = params['url'].rstrip('/')
@@ -10,7 +36,10 @@ class AkamaiIntegration:
         self.client_secret = params.get('client_secret')
         self.access_token = params.get('access_token')
         self.use_ssl = not params.get('insecure', False)
-        self.network_lists = '/network-list/v2/network-lists?includeElements=true&extended=true&listType=IP'
+        self.network_lists = '/network-list/v2/network-lists?includeElements=false&extended=true&listType=IP'
+        self.cache_ttl = int(params.get('cache_ttl') or DEFAULT_CACHE_TTL)
+        self.max_workers = int(params.get('max_workers') or DEFAULT_MAX_WORKERS)
+        self.max_retries = int(params.get('max_retries') or DEFAULT_MAX_RETRIES)
 
         if not params['proxy']:
             os.environ.pop('HTTP_PROXY', None)
@@ -29,6 +58,16 @@ class AkamaiIntegration:
             client_secret=self.client_secret,
             access_token=self.access_token
         )
+        # Size the connection pool to the worker pool so concurrent calls reuse connections
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+        self.api.mount('https://', adapter)
+        self.api.mount('http://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        # Per-call timings and a lock for integration context updates made from worker threads
+        self.metrics = []
+        self._metrics_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
 
     def _construct_address(self, list_id, ip):
         # Validate list_id and ip
@@ -36,41 +75,187 @@ class AkamaiIntegration:
             raise ValueError("Both list_id and ip must be provided")
         return f'/network-list/v2/network-lists/{list_id}/elements?element={ip}'
 
-    def _http_request(self, api_call, method, test):
-        try:
-            response = getattr(self.api, method)(self.server + api_call)
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as err:
-            self.logger.error(f"HTTP error occurred: {err}")
-            raise
-        except Exception as err:
-            self.logger.error(f"An error occurred: {err}")
-            raise
-
-        return response.json() if not test else response
-
-    def get_network_list(self, page=1):
-        list_id = demisto.args()['list-id']
-        results = []
-        response = self._http_request(f"{self.network_lists}&page={page}", 'get', False)
-        for item in response.get('networkLists', []):
-            if item['uniqueId'] == list_id:
-                ip_list = item.get('list')
-                results.append({
-                    'uniqueId': item['uniqueId'], 
-                    'name': item['name'], 
-                    'accessControlGroup': item['accessControlGroup'], 
-                    'networkListType': item['networkListType'], 
-                    'IP': ip_list
+    def _construct_list_address(self, list_id):
+        if not list_id:
+            raise ValueError("list_id must be provided")
+        return f'/network-list/v2/network-lists/{list_id}?includeElements=true&extended=true'
+
+    def _record_metric(self, method, api_call, status, elapsed, attempt):
+        with self._metrics_lock:
+            self.metrics.append({
+                'method': method.upper(),
+                'path': api_call.split('?')[0],
+                'status': status,
+                'seconds': elapsed,
+                'attempt': attempt
+            })
+
+    def get_metrics_summary(self):
+        summary = {}
+        with self._metrics_lock:
+            for metric in self.metrics:
+                entry = summary.setdefault(f"{metric['method']} {metric['path']}", {
+                    'calls': 0, 'retries': 0, 'errors': 0, 'total_seconds': 0.0, 'max_seconds': 0.0
                 })
-        return results
+                entry['calls'] += 1
+                entry['retries'] += 1 if metric['attempt'] > 0 else 0
+                entry['errors'] += 1 if metric['status'] is None or metric['status'] >= 400 else 0
+                entry['total_seconds'] += metric['seconds']
+                entry['max_seconds'] = max(entry['max_seconds'], metric['seconds'])
+        for entry in summary.values():
+            entry['avg_seconds'] = round(entry['total_seconds'] / entry['calls'], 4)
+            entry['total_seconds'] = round(entry['total_seconds'], 4)
+            entry['max_seconds'] = round(entry['max_seconds'], 4)
+        return summary
 
-    def get_network_lists(self, page=1):
-        results = []
-        response = self._http_request(f"{self.network_lists}&page={page}", 'get', False)
-        for item in response.get('networkLists', []):
-            results.append({'uniqueId': item['uniqueId'], 'name': item['name']})
-        return results
+    def _retry_delay(self, response, attempt):
+        # Full jitter keeps concurrent workers from retrying in lockstep
+        delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+        if response is None:
+            return delay
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return float(retry_after) + random.uniform(0, BACKOFF_BASE)
+            except ValueError:
+                try:
+                    wait = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+                    return max(wait, 0) + random.uniform(0, BACKOFF_BASE)
+                except (TypeError, ValueError):
+                    pass
+        # Akamai sends the time the next request will be accepted when a rate limit is hit
+        next_allowed = response.headers.get('X-RateLimit-Next')
+        if next_allowed:
+            try:
+                next_time = datetime.fromisoformat(next_allowed.replace('Z', '+00:00'))
+                wait = (next_time - datetime.now(timezone.utc)).total_seconds()
+                return max(wait, 0) + random.uniform(0, BACKOFF_BASE)
+            except ValueError:
+                pass
+        return delay
+
+    def _http_request(self, api_call, method, test, headers=None, json_data=None):
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = self.api.request(method.upper(), self.server + api_call, headers=headers, json=json_data,
+                                            verify=self.use_ssl)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as err:
+                self._record_metric(method, api_call, None, time.perf_counter() - start, attempt)
+                if attempt >= self.max_retries:
+                    self.logger.error(f"An error occurred: {err}")
+                    raise
+                delay = self._retry_delay(None, attempt)
+                self.logger.warning(f"Connection failed for {api_call}, retrying in {delay:.2f}s: {err}")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self._record_metric(method, api_call, response.status_code, time.perf_counter() - start, attempt)
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                delay = self._retry_delay(response, attempt)
+                self.logger.warning(f"HTTP {response.status_code} for {api_call}, retrying in {delay:.2f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as err:
+                self.logger.error(f"HTTP error occurred: {err}")
+                raise
+            return response.json() if not test else response
+
+    def map_concurrent(self, func, items):
+        # Results keep the order of the items; the first failure is raised once all calls finish
+        futures = [self.executor.submit(func, item) for item in items]
+        return [future.result() for future in futures]
+
+    def _get_cache(self):
+        context = demisto.getIntegrationContext() or {}
+        context.setdefault('network_lists', {})
+        context.setdefault('list_elements', {})
+        return context
+
+    @contextmanager
+    def _cache_transaction(self):
+        # Worker threads update the same context, so each read-modify-write is serialized
+        with self._cache_lock:
+            context = self._get_cache()
+            yield context
+            demisto.setIntegrationContext(context)
+
+    def _is_fresh(self, entry):
+        return bool(entry) and time.time() - entry.get('fetched_at', 0) < self.cache_ttl
+
+    def invalidate_list(self, list_id):
+        with self._cache_transaction() as context:
+            context['list_elements'].pop(list_id, None)
+            context['network_lists'] = {}
+            context.pop('ip_index', None)
+
+    def fetch_all_network_lists(self, refresh=False):
+        context = self._get_cache()
+        cached = context['network_lists']
+        if not refresh and self._is_fresh(cached):
+            return cached['lists']
+
+        lists = []
+        seen = set()
+        for page in range(1, MAX_PAGES + 1):
+            response = self._http_request(f"{self.network_lists}&page={page}", 'get', False)
+            items = [item for item in response.get('networkLists', []) if item['uniqueId'] not in seen]
+            if not items:
+                break
+            for item in items:
+                seen.add(item['uniqueId'])
+                lists.append({key: value for key, value in item.items() if key != 'list'})
+            # Stop when the API stops advertising a next page
+            links = response.get('links') or []
+            if links and not any(link.get('rel') == 'next' for link in links):
+                break
+
+        with self._cache_transaction() as context:
+            context['network_lists'] = {'fetched_at': time.time(), 'lists': lists}
+        return lists
+
+    def fetch_network_list(self, list_id, refresh=False):
+        context = self._get_cache()
+        cached = context['list_elements'].get(list_id)
+        if not refresh and self._is_fresh(cached):
+            return cached['data']
+
+        # Revalidate a stale entry with its ETag so unchanged lists are not downloaded again
+        headers = {'If-None-Match': cached['etag']} if cached and cached.get('etag') and not refresh else None
+        response = self._http_request(self._construct_list_address(list_id), 'get', True, headers=headers)
+        if response.status_code == 304 and cached:
+            data = cached['data']
+        else:
+            data = response.json()
+        with self._cache_transaction() as context:
+            context['list_elements'][list_id] = {
+                'fetched_at': time.time(),
+                'etag': response.headers.get('ETag') or (cached or {}).get('etag'),
+                'data': data
+            }
+        return data
+
+    def get_network_list(self):
+        list_id = demisto.args()['list-id']
+        refresh = demisto.args().get('refresh', 'false') == 'true'
+        item = self.fetch_network_list(list_id, refresh)
+        return [{
+            'uniqueId': item['uniqueId'],
+            'name': item['name'],
+            'accessControlGroup': item.get('accessControlGroup'),
+            'networkListType': item.get('networkListType', item.get('type')),
+            'IP': item.get('list', [])
+        }]
+
+    def get_network_lists(self):
+        refresh = demisto.args().get('refresh', 'false') == 'true'
+        return [{'uniqueId': item['uniqueId'], 'name': item['name']} for item in self.fetch_all_network_lists(refresh)]
 
     def test_module(self):
         try:
@@ -84,11 +269,239 @@ class AkamaiIntegration:
     def add_ip_to_list(self, list_id, ip):
         site = self._construct_address(list_id, ip)
         response = self._http_request(site, 'put', True)
-        if response.status_code == 204:
+        if response.status_code in (200, 204):
+            self.invalidate_list(list_id)
             return f"IP {ip} added to list {list_id}"
         else:
             return f"Failed to add IP {ip} to list {list_id}"
 
+    @staticmethod
+    def normalize_element(element):
+        # Single addresses are kept without a prefix length, networks in their canonical form
+        # CIDRs with host bits set are rejected rather than widened to their whole network
+        try:
+            network = ipaddress.ip_network(str(element).strip())
+        except ValueError:
+            return None
+        if network.num_addresses == 1:
+            return str(network.network_address)
+        return str(network)
+
+    @classmethod
+    def normalize_elements(cls, raw_elements):
+        valid = []
+        invalid = []
+        seen = set()
+        for raw in raw_elements:
+            element = str(raw).strip()
+            if not element:
+                continue
+            normalized = cls.normalize_element(element)
+            if normalized is None:
+                invalid.append(element)
+                continue
+            if normalized not in seen:
+                seen.add(normalized)
+                valid.append(normalized)
+        return valid, invalid
+
+    @staticmethod
+    def read_elements_argument(args):
+        raw_elements = re.split(r'[\s,;]+', args.get('ips') or '')
+        if args.get('entry-id'):
+            res = demisto.executeCommand('getFilePath', {'id': args['entry-id']})
+            with open(res[0]['Contents']['path'], 'r') as file:
+                raw_elements += re.split(r'[\s,;]+', file.read())
+        return raw_elements
+
+    def build_ip_index(self, refresh=False):
+        context = self._get_cache()
+        cached = context.get('ip_index')
+        if not refresh and self._is_fresh(cached):
+            return cached
+
+        # Elements are keyed by IP version, prefix length and network address, so a lookup is
+        # one dictionary probe per prefix length present in the index
+        index = {'fetched_at': time.time(), 'lists': [], 'prefixes': {'4': {}, '6': {}}}
+        lists = self.fetch_all_network_lists(refresh)
+        list_data = self.map_concurrent(lambda item: self.fetch_network_list(item['uniqueId'], refresh), lists)
+        for position, (item, data) in enumerate(zip(lists, list_data)):
+            index['lists'].append({'uniqueId': item['uniqueId'], 'name': item['name']})
+            for element in data.get('list', []):
+                try:
+                    network = ipaddress.ip_network(str(element).strip())
+                except ValueError:
+                    continue
+                by_length = index['prefixes'][str(network.version)].setdefault(str(network.prefixlen), {})
+                members = by_length.setdefault(str(int(network.network_address)), [])
+                if position not in members:
+                    members.append(position)
+
+        # Fetching the lists updated the context, so the index is stored in a fresh transaction
+        with self._cache_transaction() as context:
+            context['ip_index'] = index
+        return index
+
+    def check_ips(self, raw_elements, refresh=False):
+        index = self.build_ip_index(refresh)
+        prefix_lengths = {
+            version: sorted(int(length) for length in index['prefixes'][version])
+            for version in ('4', '6')
+        }
+        results = []
+        for raw in raw_elements:
+            element = str(raw).strip()
+            if not element:
+                continue
+            try:
+                network = ipaddress.ip_network(element)
+            except ValueError:
+                results.append({'IP': element, 'Valid': False, 'Covered': False, 'Lists': []})
+                continue
+            version = str(network.version)
+            address = int(network.network_address)
+            bits = network.max_prefixlen
+            matches = set()
+            # Any indexed network with a prefix no longer than the query's covers it if the masked addresses match
+            for length in prefix_lengths[version]:
+                if length > network.prefixlen:
+                    break
+                masked = address >> (bits - length) << (bits - length)
+                matches.update(index['prefixes'][version][str(length)].get(str(masked), []))
+            lists = [index['lists'][position] for position in sorted(matches)]
+            results.append({'IP': element, 'Valid': True, 'Covered': bool(lists), 'Lists': lists})
+        return results
+
+    def _append_elements(self, list_id, elements):
+        response = self._http_request(f'/network-list/v2/network-lists/{list_id}/append', 'post', True,
+                                      json_data={'list': elements})
+        return response.json()
+
+    def _update_elements(self, list_data, elements):
+        body = {
+            'name': list_data['name'],
+            'type': list_data.get('type', list_data.get('networkListType', 'IP')),
+            'description': list_data.get('description', ''),
+            'syncPoint': list_data['syncPoint'],
+            'list': elements
+        }
+        response = self._http_request(f"/network-list/v2/network-lists/{list_data['uniqueId']}", 'put', True,
+                                      json_data=body)
+        return response.json()
+
+    def activate_list(self, list_id, environment, comments):
+        body = {'comments': comments}
+        response = self._http_request(
+            f'/network-list/v2/network-lists/{list_id}/environments/{environment.upper()}/activate', 'post', True,
+            json_data=body
+        )
+        return response.json()
+
+    def _apply_batches(self, list_id, list_data, pending, action, batch_size, first_batch=1):
+        batches = []
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            result = {'Batch': first_batch + len(batches), 'Action': action, 'Elements': len(batch)}
+            try:
+                if action == 'add':
+                    list_data = self._append_elements(list_id, batch)
+                else:
+                    # Removal has no bulk endpoint, so the list is rewritten without the batch
+                    removing = set(batch)
+                    remaining = [element for element in list_data.get('list', [])
+                                 if self.normalize_element(element) not in removing]
+                    list_data = self._update_elements(list_data, remaining)
+                result['Status'] = 'OK'
+            except Exception as e:
+                self.logger.error(f"Batch {result['Batch']} failed: {e}")
+                result['Status'] = f'Failed: {e}'
+                batches.append(result)
+                break
+            batches.append(result)
+        return batches, list_data
+
+    def bulk_update_list(self, list_id, raw_elements, action='add', batch_size=DEFAULT_BULK_BATCH_SIZE,
+                         activate=None, comments='Updated by Cortex XSOAR'):
+        if action not in ('add', 'remove'):
+            raise ValueError("action must be add or remove")
+        valid, invalid = self.normalize_elements(raw_elements)
+        list_data = self.fetch_network_list(list_id, refresh=True)
+        current = set(self.normalize_elements(list_data.get('list', []))[0])
+        if action == 'add':
+            pending = [element for element in valid if element not in current]
+            skipped = [element for element in valid if element in current]
+        else:
+            pending = [element for element in valid if element in current]
+            skipped = [element for element in valid if element not in current]
+
+        batches, list_data = self._apply_batches(list_id, list_data, pending, action, batch_size)
+        self.invalidate_list(list_id)
+
+        summary = {
+            'listId': list_id,
+            'action': action,
+            'requested': len(valid),
+            'applied': sum(batch['Elements'] for batch in batches if batch['Status'] == 'OK'),
+            'unchanged': skipped,
+            'invalid': invalid,
+            'batches': batches
+        }
+        if activate and batches and all(batch['Status'] == 'OK' for batch in batches):
+            summary['activation'] = self.activate_list(list_id, activate, comments)
+        return summary
+
+    def read_indicator_values(self, query, limit=None):
+        values = []
+        search_after = None
+        while True:
+            res = demisto.searchIndicators(query=query, size=INDICATOR_PAGE_SIZE, searchAfter=search_after)
+            iocs = res.get('iocs') or []
+            values += [ioc.get('value') for ioc in iocs if ioc.get('value')]
+            search_after = res.get('searchAfter')
+            if not iocs or not search_after or (limit and len(values) >= limit):
+                break
+        return values[:limit] if limit else values
+
+    def sync_list(self, list_id, raw_elements, batch_size=DEFAULT_BULK_BATCH_SIZE, refresh=False, dry_run=False,
+                  activate=None, comments='Synced by Cortex XSOAR', allow_empty=False):
+        desired, invalid = self.normalize_elements(raw_elements)
+        if not desired and not allow_empty:
+            raise ValueError("The desired set is empty; pass allow-empty=true to clear the list")
+        list_data = self.fetch_network_list(list_id, refresh)
+        current = self.normalize_elements(list_data.get('list', []))[0]
+        desired_set = set(desired)
+        current_set = set(current)
+        adds = [element for element in desired if element not in current_set]
+        removes = [element for element in current if element not in desired_set]
+
+        batches = []
+        if not dry_run:
+            # The rewrite needs the list's latest syncPoint, so removals read the list from the API first
+            if removes:
+                list_data = self.fetch_network_list(list_id, refresh=True)
+                batches, list_data = self._apply_batches(list_id, list_data, removes, 'remove', len(removes))
+            if all(batch['Status'] == 'OK' for batch in batches):
+                add_batches, list_data = self._apply_batches(list_id, list_data, adds, 'add', batch_size,
+                                                             first_batch=len(batches) + 1)
+                batches += add_batches
+            if batches:
+                self.invalidate_list(list_id)
+
+        summary = {
+            'listId': list_id,
+            'dryRun': dry_run,
+            'desired': len(desired),
+            'current': len(current),
+            'unchanged': len(desired_set & current_set),
+            'added': adds,
+            'removed': removes,
+            'invalid': invalid,
+            'batches': batches
+        }
+        if activate and batches and all(batch['Status'] == 'OK' for batch in batches):
+            summary['activation'] = self.activate_list(list_id, activate, comments)
+        return summary
+
 def main():
     akamai = AkamaiIntegration(demisto.params())
     try:
@@ -102,9 +515,47 @@ def main():
             list_id = demisto.args()['list-id']
             ip = demisto.args()['ip']
             demisto.results(akamai.add_ip_to_list(list_id, ip))
+        elif demisto.command() == 'akamai-check-ip':
+            args = demisto.args()
+            raw_elements = akamai.read_elements_argument({'ips': args.get('ip'), 'entry-id': args.get('entry-id')})
+            demisto.results(akamai.check_ips(raw_elements, args.get('refresh', 'false') == 'true'))
+        elif demisto.command() == 'akamai-bulk-update-list':
+            args = demisto.args()
+            activate = args.get('activate')
+            raw_elements = akamai.read_elements_argument(args)
+            # Writes to one list stay sequential; several lists are updated in parallel
+            list_ids = [list_id.strip() for list_id in args['list-id'].split(',') if list_id.strip()]
+            results = akamai.map_concurrent(lambda list_id: akamai.bulk_update_list(
+                list_id,
+                raw_elements,
+                action=args.get('action', 'add'),
+                batch_size=int(args.get('batch-size', DEFAULT_BULK_BATCH_SIZE)),
+                activate=activate if activate in ('staging', 'production') else None,
+                comments=args.get('comments', 'Updated by Cortex XSOAR')
+            ), list_ids)
+            demisto.results(results[0] if len(results) == 1 else results)
+        elif demisto.command() == 'akamai-sync-list':
+            args = demisto.args()
+            activate = args.get('activate')
+            raw_elements = akamai.read_elements_argument(args)
+            if args.get('indicator-query'):
+                raw_elements += akamai.read_indicator_values(args['indicator-query'])
+            demisto.results(akamai.sync_list(
+                args['list-id'],
+                raw_elements,
+                batch_size=int(args.get('batch-size', DEFAULT_BULK_BATCH_SIZE)),
+                refresh=args.get('refresh', 'false') == 'true',
+                dry_run=args.get('dry-run', 'false') == 'true',
+                activate=activate if activate in ('staging', 'production') else None,
+                comments=args.get('comments', 'Synced by Cortex XSOAR'),
+                allow_empty=args.get('allow-empty', 'false') == 'true'
+            ))
     except Exception as e:
         akamai.logger.exception(f'Error has occurred in the Akamai Integration: {type(e)}\n {str(e)}')
         raise
+    finally:
+        akamai.executor.shutdown(wait=False)
+        akamai.logger.info(f'Akamai request metrics: {akamai.get_metrics_summary()}')
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,153 @@
+# Benchmark for akamai_integrate.py against the offline mock in mock_akamai_server.py
+# Times bulk add, list fetch, index build, IP lookups and sync for each list size.
+# Example: python benchmark_akamai_integrate.py --sizes 10000,50000,100000 --lookups 20000 --rate-limit 100
+import argparse
+import os
+import random
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import akamai_integrate
+from mock_akamai_server import MockAkamaiServer, random_elements
+
+STAGES = ['bulk add', 'fetch', 'revalidate', 'index', 'lookup', 'sync']
+
+def install_demisto():
+    # akamai_integrate expects the demisto object XSOAR injects; the benchmark keeps its context in memory
+    context = {}
+    akamai_integrate.demisto = types.SimpleNamespace(
+        getIntegrationContext=lambda: context,
+        setIntegrationContext=lambda value: context.update(value),
+        args=lambda: {},
+        params=lambda: {},
+        command=lambda: None,
+        results=print
+    )
+    return context
+
+def measure(stage_results, stage, func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    stage_results[stage] = time.perf_counter() - start
+    return result
+
+def lookup_sample(elements, count, miss_ratio, seed):
+    # Hits are taken from the list (addresses inside a /24 for network elements), misses are random addresses
+    rng = random.Random(seed)
+    sample = []
+    for _ in range(count):
+        if rng.random() < miss_ratio:
+            sample.append(f"{rng.randint(224, 239)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}")
+        else:
+            element = rng.choice(elements)
+            sample.append(element.replace('.0/24', f'.{rng.randint(1, 254)}') if element.endswith('/24') else element)
+    return sample
+
+def run_size(server, size, args):
+    context = install_demisto()
+    akamai = akamai_integrate.AkamaiIntegration({
+        'url': server.url,
+        'client_token': 'mock-client-token',
+        'client_secret': 'mock-client-secret',
+        'access_token': 'mock-access-token',
+        'proxy': False,
+        'insecure': True,
+        'cache_ttl': args.cache_ttl,
+        'max_workers': args.workers,
+        'max_retries': args.retries
+    })
+    # Each size indexes only its own lists
+    server.store.lists.clear()
+    list_id = server.store.create_list(f"Benchmark {size}", list_id=f"{size}_BENCHMARK")
+    for index in range(args.extra_lists):
+        server.store.create_list(f"Benchmark {size} extra {index}", random_elements(size // 10, seed=size + index),
+                                 list_id=f"{size}_BENCHMARK_EXTRA{index}")
+    elements = random_elements(size, seed=size)
+    requests_before = server.store.requests
+    throttled_before = server.store.throttled
+    stage_results = {}
+
+    try:
+        summary = measure(stage_results, 'bulk add', akamai.bulk_update_list, list_id, elements,
+                          batch_size=args.batch_size)
+        failed = [batch for batch in summary['batches'] if batch['Status'] != 'OK']
+        if failed:
+            raise RuntimeError(f"Bulk add failed: {failed[0]['Status']}")
+        measure(stage_results, 'fetch', akamai.fetch_network_list, list_id, refresh=True)
+        # An expired cache entry is revalidated with its ETag and answered with a 304
+        context['list_elements'][list_id]['fetched_at'] = 0
+        measure(stage_results, 'revalidate', akamai.fetch_network_list, list_id)
+        measure(stage_results, 'index', akamai.build_ip_index, refresh=True)
+        sample = lookup_sample(elements, args.lookups, args.miss_ratio, size)
+        results = measure(stage_results, 'lookup', akamai.check_ips, sample)
+        covered = sum(1 for result in results if result['Covered'])
+
+        changed = max(int(size * args.change), 1)
+        desired = elements[changed:] + random_elements(changed, seed=size + 1000, cidr_every=0)
+        sync = measure(stage_results, 'sync', akamai.sync_list, list_id, desired, batch_size=args.batch_size,
+                       allow_empty=True)
+    finally:
+        akamai.executor.shutdown(wait=True)
+
+    return {
+        'seconds': stage_results,
+        'elements': len(server.store.lists[list_id]['elements']),
+        'adds_per_second': size / stage_results['bulk add'],
+        'lookups_per_second': len(sample) / stage_results['lookup'],
+        'covered': covered,
+        'synced': len(sync['added']) + len(sync['removed']),
+        'requests': server.store.requests - requests_before,
+        'throttled': server.store.throttled - throttled_before
+    }
+
+def print_table(results):
+    headers = ['Size', 'Elements'] + [f"{stage} (s)" for stage in STAGES] + \
+              ['Adds/s', 'Lookups/s', 'Covered', 'Synced', 'Requests', '429s']
+    lines = []
+    for size, result in results.items():
+        lines.append([str(size), str(result['elements'])] +
+                     [f"{result['seconds'].get(stage, 0.0):.3f}" for stage in STAGES] +
+                     [f"{result['adds_per_second']:.0f}", f"{result['lookups_per_second']:.0f}",
+                      str(result['covered']), str(result['synced']), str(result['requests']),
+                      str(result['throttled'])])
+    widths = [max(len(row[idx]) for row in [headers] + lines) for idx in range(len(headers))]
+    print(' | '.join(header.ljust(width) for header, width in zip(headers, widths)))
+    print('-+-'.join('-' * width for width in widths))
+    for line in lines:
+        print(' | '.join(value.ljust(width) for value, width in zip(line, widths)))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Akamai integration against an offline mock API.')
+    parser.add_argument('--sizes', default='10000,50000,100000', help='Comma-separated list sizes to benchmark.')
+    parser.add_argument('--batch-size', type=int, default=akamai_integrate.DEFAULT_BULK_BATCH_SIZE,
+                        help='Elements per bulk request.')
+    parser.add_argument('--lookups', type=int, default=10000, help='IPs checked against the index per size.')
+    parser.add_argument('--miss-ratio', type=float, default=0.5, help='Fraction of lookups not in any list.')
+    parser.add_argument('--change', type=float, default=0.01, help='Fraction of the list replaced by the sync.')
+    parser.add_argument('--extra-lists', type=int, default=4, help='Additional lists (a tenth of the size) indexed.')
+    parser.add_argument('--workers', type=int, default=akamai_integrate.DEFAULT_MAX_WORKERS,
+                        help='Integration max_workers.')
+    parser.add_argument('--retries', type=int, default=akamai_integrate.DEFAULT_MAX_RETRIES,
+                        help='Integration max_retries.')
+    parser.add_argument('--cache-ttl', type=int, default=akamai_integrate.DEFAULT_CACHE_TTL,
+                        help='Integration cache_ttl.')
+    parser.add_argument('--rate-limit', type=float, default=0, help='Mock requests per second before 429s.')
+    parser.add_argument('--burst', type=int, default=None, help='Mock requests allowed in a burst above the rate limit.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of mock requests answered with 503.')
+    args = parser.parse_args()
+
+    results = {}
+    with MockAkamaiServer(rate_limit=args.rate_limit, burst=args.burst, error_rate=args.error_rate) as server:
+        print(f"Mock Akamai Network Lists API listening on {server.url}")
+        for size in [int(size) for size in args.sizes.split(',') if size.strip()]:
+            try:
+                results[size] = run_size(server, size, args)
+            except Exception as e:
+                print(f"Error while benchmarking size: {size}")
+                print(f"Error message: {str(e)}")
+    print_table(results)
+
+if __name__ == '__main__':
+    main()
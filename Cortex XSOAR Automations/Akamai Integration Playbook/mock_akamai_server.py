@@ -0,0 +1,294 @@
+# Offline mock of the Akamai Network Lists v2 API used by akamai_integrate.py
+# EdgeGrid signatures are accepted without being verified, so any credentials work.
+# Example: python mock_akamai_server.py --port 8085 --lists 5 --elements 1000 --rate-limit 50
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+API_PREFIX = '/network-list/v2/network-lists'
+DEFAULT_PAGE_SIZE = 50
+
+class MockNetworkLists:
+    def __init__(self, rate_limit=0, burst=None, error_rate=0.0, require_auth=False):
+        self.lists = {}
+        self.lock = threading.Lock()
+        # Token bucket: rate_limit requests per second, 0 disables limiting
+        self.rate_limit = rate_limit
+        self.burst = burst or max(rate_limit, 1)
+        self.tokens = float(self.burst)
+        self.refilled_at = time.monotonic()
+        self.error_rate = error_rate
+        self.require_auth = require_auth
+        self.requests = 0
+        self.throttled = 0
+
+    def create_list(self, name, elements=(), list_id=None):
+        list_id = list_id or f"{random.randint(1000, 99999)}_{name.upper().replace(' ', '')}"
+        with self.lock:
+            self.lists[list_id] = {
+                'uniqueId': list_id,
+                'name': name,
+                'type': 'IP',
+                'description': '',
+                'syncPoint': 0,
+                'accessControlGroup': 'Mock Group',
+                'elements': list(dict.fromkeys(elements)),
+                'activations': []
+            }
+        return list_id
+
+    def take_token(self):
+        # Returns 0 when the request may proceed, otherwise the seconds until the next token
+        if not self.rate_limit:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate_limit)
+            self.refilled_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            self.throttled += 1
+            return (1 - self.tokens) / self.rate_limit
+
+    @staticmethod
+    def render(item, include_elements=True):
+        body = {key: value for key, value in item.items() if key not in ('elements', 'activations')}
+        body['networkListType'] = 'IP'
+        body['elementCount'] = len(item['elements'])
+        if include_elements:
+            body['list'] = list(item['elements'])
+        return body
+
+    @staticmethod
+    def etag(item):
+        return f'"{item["uniqueId"]}-{item["syncPoint"]}"'
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    store = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body=None, headers=None):
+        payload = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        if body is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}') if length else {}
+
+    def problem(self, status, title, detail=''):
+        self.send_json(status, {'type': 'mock-error', 'title': title, 'status': status, 'detail': detail})
+
+    def dispatch(self, method):
+        store = self.store
+        with store.lock:
+            store.requests += 1
+        # Read the body up front so keep-alive connections stay in sync after an early error response
+        body = self.read_json() if method in ('POST', 'PUT') else {}
+
+        if store.require_auth and not (self.headers.get('Authorization') or '').startswith('EG1-HMAC-SHA256'):
+            return self.problem(401, 'Unauthorized', 'Missing EdgeGrid Authorization header')
+        wait = store.take_token()
+        if wait:
+            next_allowed = datetime.now(timezone.utc) + timedelta(seconds=wait)
+            return self.send_json(429, {'title': 'Too Many Requests', 'status': 429}, {
+                'Retry-After': f'{wait:.3f}',
+                'X-RateLimit-Next': next_allowed.isoformat().replace('+00:00', 'Z')
+            })
+        if store.error_rate and random.random() < store.error_rate:
+            return self.problem(503, 'Service Unavailable', 'Injected failure')
+
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = [part for part in url.path[len(API_PREFIX):].split('/') if part] if url.path.startswith(API_PREFIX) \
+            else None
+        if parts is None:
+            return self.problem(404, 'Not Found', url.path)
+
+        if not parts:
+            if method == 'GET':
+                return self.list_lists(query)
+            if method == 'POST':
+                list_id = store.create_list(body.get('name', 'Mock List'), body.get('list', []))
+                return self.send_json(201, store.render(store.lists[list_id]))
+            return self.problem(405, 'Method Not Allowed')
+
+        with store.lock:
+            item = store.lists.get(parts[0])
+            if item is None:
+                return self.problem(404, 'Not Found', f'Network list {parts[0]} does not exist')
+            route = parts[1:]
+            if not route:
+                return self.single_list(method, item, query, body)
+            if route == ['elements']:
+                return self.single_element(method, item, query.get('element'))
+            if route == ['append'] and method == 'POST':
+                return self.append_elements(item, body)
+            if len(route) == 3 and route[0] == 'environments' and route[2] == 'activate' and method == 'POST':
+                activation = {
+                    'activationId': len(item['activations']) + 1,
+                    'uniqueId': item['uniqueId'],
+                    'environment': route[1].upper(),
+                    'activationStatus': 'PENDING_ACTIVATION',
+                    'syncPoint': item['syncPoint'],
+                    'comments': body.get('comments', '')
+                }
+                item['activations'].append(activation)
+                return self.send_json(200, activation)
+        return self.problem(404, 'Not Found', url.path)
+
+    def list_lists(self, query):
+        store = self.store
+        page = max(int(query.get('page', 1)), 1)
+        page_size = max(int(query.get('pageSize', DEFAULT_PAGE_SIZE)), 1)
+        include_elements = query.get('includeElements', 'false') == 'true'
+        with store.lock:
+            items = sorted(store.lists.values(), key=lambda item: item['uniqueId'])
+            page_items = [store.render(item, include_elements) for item in
+                          items[(page - 1) * page_size:page * page_size]]
+        links = []
+        if page * page_size < len(items):
+            links.append({'rel': 'next', 'href': f'{API_PREFIX}?page={page + 1}&pageSize={page_size}'})
+        return self.send_json(200, {'networkLists': page_items, 'links': links})
+
+    def single_list(self, method, item, query, body):
+        store = self.store
+        if method == 'GET':
+            etag = store.etag(item)
+            if self.headers.get('If-None-Match') == etag:
+                return self.send_json(304, headers={'ETag': etag})
+            include_elements = query.get('includeElements', 'true') == 'true'
+            return self.send_json(200, store.render(item, include_elements), {'ETag': etag})
+        if method == 'PUT':
+            # Updates must carry the current syncPoint, like the real API
+            if body.get('syncPoint') != item['syncPoint']:
+                return self.problem(409, 'Conflict', f"syncPoint {body.get('syncPoint')} is not {item['syncPoint']}")
+            item['name'] = body.get('name', item['name'])
+            item['description'] = body.get('description', item['description'])
+            item['elements'] = list(dict.fromkeys(body.get('list', [])))
+            item['syncPoint'] += 1
+            return self.send_json(200, store.render(item), {'ETag': store.etag(item)})
+        if method == 'DELETE':
+            del store.lists[item['uniqueId']]
+            return self.send_json(204)
+        return self.problem(405, 'Method Not Allowed')
+
+    def single_element(self, method, item, element):
+        if not element:
+            return self.problem(400, 'Bad Request', 'The element query parameter is required')
+        if method == 'PUT':
+            if element not in item['elements']:
+                item['elements'].append(element)
+                item['syncPoint'] += 1
+            return self.send_json(200, self.store.render(item))
+        if method == 'DELETE':
+            if element in item['elements']:
+                item['elements'].remove(element)
+                item['syncPoint'] += 1
+            return self.send_json(200, self.store.render(item))
+        return self.problem(405, 'Method Not Allowed')
+
+    def append_elements(self, item, body):
+        present = set(item['elements'])
+        added = [element for element in dict.fromkeys(body.get('list', [])) if element not in present]
+        if added:
+            item['elements'] += added
+            item['syncPoint'] += 1
+        return self.send_json(200, self.store.render(item))
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+class MockAkamaiServer:
+    def __init__(self, host='127.0.0.1', port=0, **store_options):
+        self.store = MockNetworkLists(**store_options)
+        handler = type('BoundMockRequestHandler', (MockRequestHandler,), {'store': self.store})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+def random_elements(count, seed=0, cidr_every=10):
+    # Unique IPv4 addresses, with every Nth element a /24 network
+    rng = random.Random(seed)
+    elements = set()
+    while len(elements) < count:
+        address = rng.randint(0x01000000, 0xDFFFFFFF)
+        if cidr_every and len(elements) % cidr_every == 0:
+            address &= 0xFFFFFF00
+            elements.add(f"{address >> 24}.{address >> 16 & 255}.{address >> 8 & 255}.0/24")
+        else:
+            elements.add(f"{address >> 24}.{address >> 16 & 255}.{address >> 8 & 255}.{address & 255}")
+    return list(elements)
+
+def main():
+    parser = argparse.ArgumentParser(description='Run an offline mock of the Akamai Network Lists v2 API.')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on.')
+    parser.add_argument('--port', type=int, default=8085, help='Port to listen on.')
+    parser.add_argument('--lists', type=int, default=3, help='Network lists to create at startup.')
+    parser.add_argument('--elements', type=int, default=100, help='Elements per network list created at startup.')
+    parser.add_argument('--rate-limit', type=float, default=0, help='Requests per second before 429s (0 disables).')
+    parser.add_argument('--burst', type=int, default=None, help='Requests allowed in a burst above the rate limit.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with a 503.')
+    parser.add_argument('--require-auth', action='store_true', help='Reject requests without an EdgeGrid header.')
+    args = parser.parse_args()
+
+    server = MockAkamaiServer(args.host, args.port, rate_limit=args.rate_limit, burst=args.burst,
+                              error_rate=args.error_rate, require_auth=args.require_auth)
+    for index in range(args.lists):
+        list_id = server.store.create_list(f"Mock List {index}", random_elements(args.elements, seed=index),
+                                           list_id=f"{1000 + index}_MOCKLIST{index}")
+        print(f"Created {list_id} with {args.elements} elements")
+    print(f"Mock Akamai Network Lists API listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+if __name__ == '__main__':
+    main()
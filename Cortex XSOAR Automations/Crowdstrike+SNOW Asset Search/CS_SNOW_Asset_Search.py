@@ -1,12 +1,107 @@
-import base64
 import csv
-import io
-import sys
+import ipaddress
 import re
-from operator import itemgetter
 import demisto_sdk as demisto
 import xlsxwriter
 import os
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from itertools import islice
+
+# Longest FQL filter sent in one cs-falcon-search-device call; IPs are packed into batches up to this length
+CS_MAX_FILTER_LENGTH = 2000
+# Devices requested per cs-falcon-search-device page
+CS_PAGE_LIMIT = 500
+# IPs combined into one ServiceNow ip_addressIN query
+SNOW_BATCH_SIZE = 100
+# Records requested per servicenow-cmdb-records-list page
+SNOW_PAGE_LIMIT = 500
+# Concurrent ServiceNow commands
+SNOW_MAX_WORKERS = 8
+# Lookup cache location, lifetimes in seconds for found and not-found results, and entry limit
+CACHE_PATH = os.path.join(tempfile.gettempdir(), 'cs_snow_asset_cache.db')
+CACHE_POSITIVE_TTL = 24 * 60 * 60
+CACHE_NEGATIVE_TTL = 60 * 60
+CACHE_MAX_ENTRIES = 50000
+# Longest text xlsxwriter can store in a single cell
+XLSX_MAX_CELL_LENGTH = 32767
+# Most addresses CIDRs and ranges in one run's input may expand to
+MAX_EXPANDED_IPS = 4096
+
+class LookupCache:
+    """
+    SQLite cache of asset lookups keyed by (source, IP), with separate lifetimes for found and
+    not-found results and least-recently-used eviction once max_entries is exceeded.
+    """
+    def __init__(self, path=CACHE_PATH, positive_ttl=CACHE_POSITIVE_TTL, negative_ttl=CACHE_NEGATIVE_TTL,
+                 max_entries=CACHE_MAX_ENTRIES):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.stats = {}
+        # Both query phases share the connection, so every statement runs under the lock
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS lookups (source TEXT NOT NULL, ip TEXT NOT NULL, found INTEGER NOT NULL, '
+                'records TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (source, ip))'
+            )
+            self.connection.execute('CREATE INDEX IF NOT EXISTS lookups_last_used ON lookups (last_used)')
+
+    def _count(self, source, key, amount=1):
+        counts = self.stats.setdefault(source, {'hits': 0, 'negative_hits': 0, 'misses': 0, 'expired': 0})
+        counts[key] += amount
+
+    def get_many(self, source, ips):
+        """
+        Returns a dictionary of each cached IP to its list of records (empty when cached as not found).
+        """
+        cached = {}
+        now = time.time()
+        with self.lock, self.connection:
+            for start in range(0, len(ips), 500):
+                chunk = ips[start:start + 500]
+                rows = self.connection.execute(
+                    f"SELECT ip, found, records, expires_at FROM lookups WHERE source = ? "
+                    f"AND ip IN ({','.join('?' * len(chunk))})", [source] + chunk
+                ).fetchall()
+                for ip, found, records, expires_at in rows:
+                    if expires_at <= now:
+                        self._count(source, 'expired')
+                        continue
+                    cached[ip] = json.loads(records)
+                    self._count(source, 'hits' if found else 'negative_hits')
+            self.connection.executemany('UPDATE lookups SET last_used = ? WHERE source = ? AND ip = ?',
+                                        [(now, source, ip) for ip in cached])
+        self._count(source, 'misses', len(ips) - len(cached))
+        return cached
+
+    def put_many(self, source, results):
+        """
+        Stores a dictionary of IPs to their records, then evicts expired and least recently used entries.
+        """
+        now = time.time()
+        rows = [
+            (source, ip, 1 if records else 0, json.dumps(records),
+             now + (self.positive_ttl if records else self.negative_ttl), now)
+            for ip, records in results.items()
+        ]
+        with self.lock, self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO lookups VALUES (?, ?, ?, ?, ?, ?)', rows)
+            self.connection.execute('DELETE FROM lookups WHERE expires_at <= ?', (now,))
+            self.connection.execute(
+                'DELETE FROM lookups WHERE rowid IN (SELECT rowid FROM lookups ORDER BY last_used DESC '
+                'LIMIT -1 OFFSET ?)', (self.max_entries,)
+            )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
 
 class QueryHelper:
     """
@@ -17,92 +112,353 @@ class QueryHelper:
         'outbound_relations': 'Outbound Relations'
     }
 
-    ip_pattern = re.compile(r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}')
+    # Separators between entries, and ranges written as 10.0.0.1-10.0.0.20 or 10.0.0.1-20
+    input_separator = re.compile(r'[\s,;]+')
+    # Spaces around a range's dash are removed before splitting, so "10.0.0.1 - 10.0.0.4" stays one entry
+    range_separator = re.compile(r'\s*-\s*')
+    range_pattern = re.compile(r'^(?P<start>[^-\s]+)\s*-\s*(?P<end>[^-\s]+)$')
 
-    def __init__(self):
-        # Initialize sets and lists to store results and checked items
-        self.checked_items = set()
+    def __init__(self, cs_filter_length=CS_MAX_FILTER_LENGTH, snow_batch_size=SNOW_BATCH_SIZE,
+                 snow_workers=SNOW_MAX_WORKERS, cache=None):
+        # Each source keeps its own checked items so one phase never skips items the other has queried
+        self.cs_filter_length = cs_filter_length
+        self.snow_batch_size = snow_batch_size
+        self.snow_workers = snow_workers
+        self.cache = cache
+        self.cs_checked_items = set()
+        self.snow_checked_items = set()
         self.crowdstrike_results = []
         self.crowdstrike_not_found = []
         self.servicenow_results = []
         self.servicenow_not_found = []
+        # IPs whose lookup failed are neither cached nor reported as not found
+        self.failed_lookups = []
         # Read instance name from environment variable or configuration file
         self.servicenow_instance = os.getenv('SERVICENOW_INSTANCE', 'default_instance')
 
-    def cs_query_helper(self, filter_key, filter_value):
+    @staticmethod
+    def expand_entry(entry, budget):
         """
-        Queries CrowdStrike Falcon for devices based on the filter key and value.
-        Appends results to crowdstrike_results if found, otherwise appends to crowdstrike_not_found.
+        Returns the addresses an IP, CIDR or range entry stands for, or None when it expands to more
+        than budget addresses. Raises ValueError when the entry is not valid.
         """
-        found = False
-        response = demisto.executeCommand('cs-falcon-search-device', {'filter': f'{filter_key}:"{filter_value}"'})
-        for res in response:
-            if 'resources' in res['Contents']:
-                found = True
-                try:
-                    self.crowdstrike_results.append(res['Contents']['resources'][0])
-                except (KeyError, TypeError, IndexError):
-                    continue
-        return found
+        # Defanged indicators such as 10.0.0[.]1 are common in pasted alert data
+        entry = entry.strip('\'"[]()<>').replace('[.]', '.').replace('[:]', ':')
+        match = QueryHelper.range_pattern.match(entry)
+        if match:
+            start = ipaddress.ip_address(match.group('start'))
+            end = match.group('end')
+            if end.isdigit() and start.version == 4:
+                # Short form: only the last octet of the range end is given
+                end = f"{str(start).rsplit('.', 1)[0]}.{end}"
+            end = ipaddress.ip_address(end)
+            if end.version != start.version or end < start:
+                raise ValueError('Invalid range')
+            if int(end) - int(start) + 1 > budget:
+                return None
+            return [str(ipaddress.ip_address(value)) for value in range(int(start), int(end) + 1)]
+        if '/' in entry:
+            network = ipaddress.ip_network(entry, strict=False)
+            hosts = [str(host) for host in islice(network.hosts(), budget + 1)]
+            return hosts if len(hosts) <= budget else None
+        return [str(ipaddress.ip_address(entry))]
 
-    def snow_query_helper(self, filter_key, filter_value):
+    @classmethod
+    def normalize_input(cls, data, max_expansion=MAX_EXPANDED_IPS):
+        """
+        Splits, validates, expands and deduplicates the input data.
+        Returns the unique IPs in input order, the rejected entries and the number of duplicates dropped.
         """
-        Queries ServiceNow CMDB for records based on the filter key and value.
-        Appends results to servicenow_results if found, otherwise appends to servicenow_not_found.
+        if isinstance(data, str):
+            data = [data]
+        entries = [
+            entry for item in data or []
+            for entry in cls.input_separator.split(cls.range_separator.sub('-', str(item))) if entry
+        ]
+        ips = {}
+        rejected = []
+        duplicates = 0
+        budget = max_expansion
+        for entry in entries:
+            try:
+                expanded = cls.expand_entry(entry, budget)
+            except ValueError:
+                rejected.append({'Data': entry, 'Reason': 'Not a valid IP, CIDR or range'})
+                continue
+            if expanded is None:
+                rejected.append({'Data': entry, 'Reason': f'Expands past the {max_expansion} address limit'})
+                continue
+            if len(expanded) > 1:
+                budget -= len(expanded)
+            for ip in expanded:
+                if ip in ips:
+                    duplicates += 1
+                else:
+                    ips[ip] = True
+        return list(ips), rejected, duplicates
+
+    @staticmethod
+    def build_fql_batches(filter_key, values, max_length):
         """
-        found = False
-        snow_response = demisto.executeCommand('servicenow-cmdb-records-list', {
+        Packs values into FQL filters of the form key:['a','b',...] no longer than max_length.
+        """
+        batches = []
+        batch = []
+        length = len(f"{filter_key}:[]")
+        for value in values:
+            # Each value adds its quotes and a separating comma
+            value_length = len(value) + 3
+            if batch and length + value_length > max_length:
+                batches.append(batch)
+                batch = []
+                length = len(f"{filter_key}:[]")
+            batch.append(value)
+            length += value_length
+        if batch:
+            batches.append(batch)
+        return batches
+
+    @staticmethod
+    def extract_resources(response):
+        """
+        Returns the device resources from a cs-falcon-search-device response.
+        """
+        resources = []
+        for res in response or []:
+            contents = res.get('Contents') if isinstance(res, dict) else None
+            if isinstance(contents, dict):
+                contents = contents.get('resources')
+            if isinstance(contents, list):
+                resources += [resource for resource in contents if isinstance(resource, dict)]
+        return resources
+
+    def cs_query_helper(self, filter_key, filter_values):
+        """
+        Queries CrowdStrike Falcon for devices whose filter key matches any of the filter values.
+        Returns a dictionary of each filter key value to the devices that have it.
+        """
+        quoted = ','.join(f"'{value}'" for value in filter_values)
+        fql_filter = f"{filter_key}:[{quoted}]"
+        matches = {}
+        offset = 0
+        while True:
+            response = demisto.executeCommand('cs-falcon-search-device', {
+                'filter': fql_filter,
+                'limit': CS_PAGE_LIMIT,
+                'offset': offset
+            })
+            # An error entry is not an empty result; raising keeps the batch out of the cache
+            if is_error(response):
+                raise Exception(get_error(response))
+            resources = self.extract_resources(response)
+            for resource in resources:
+                matches.setdefault(resource.get(filter_key), []).append(resource)
+            # A full page means more devices may match the filter
+            if len(resources) < CS_PAGE_LIMIT:
+                break
+            offset += CS_PAGE_LIMIT
+        return matches
+
+    def snow_query_helper(self, filter_key, filter_values):
+        """
+        Queries ServiceNow CMDB for records whose filter key is any of the filter values.
+        Returns a dictionary of each matched value to the sys_ids of its records.
+        """
+        matches = {}
+        offset = 0
+        while True:
+            snow_response = demisto.executeCommand('servicenow-cmdb-records-list', {
+                'class': 'cmdb_ci',
+                'limit': SNOW_PAGE_LIMIT,
+                'offset': offset,
+                'fields': f'sys_id,name,{filter_key}',
+                'query': f"{filter_key}IN{','.join(filter_values)}",
+                'using': self.servicenow_instance
+            })
+            if is_error(snow_response):
+                raise Exception(get_error(snow_response))
+            try:
+                records = snow_response[0]['Contents']['result'] or []
+            except (KeyError, TypeError, IndexError):
+                records = []
+            for record in records:
+                if record.get('sys_id'):
+                    matches.setdefault(record.get(filter_key), []).append(record['sys_id'])
+            # A full page means more records may match the query
+            if len(records) < SNOW_PAGE_LIMIT:
+                break
+            offset += SNOW_PAGE_LIMIT
+        return matches
+
+    def snow_record_details(self, sys_id):
+        """
+        Fetches one CMDB record and flattens its attributes and relations into a single dictionary.
+        """
+        detailed_results = demisto.executeCommand('servicenow-cmdb-record-get-by-id', {
             'class': 'cmdb_ci',
-            'limit': 20,
-            'query': f'{filter_key}LIKE{filter_value}',
+            'sys_id': sys_id,
             'using': self.servicenow_instance
         })
+        if is_error(detailed_results):
+            raise Exception(get_error(detailed_results))
         try:
-            detailed_results = demisto.executeCommand('servicenow-cmdb-record-get-by-id', {
-                'class': 'cmdb_ci',
-                'sys_id': snow_response[0]['Contents']['result'][0]['sys_id'],
-                'using': self.servicenow_instance
-            })
-            demisto.log(f'Queried {filter_value}! Results found.')
-            for result in detailed_results:
-                self.servicenow_results.append(result)
-                found = True
+            result = detailed_results[0]['Contents']['result']
         except (KeyError, TypeError, IndexError):
-            pass
-        return found
+            return None
+        record = dict(result.get('attributes') or {})
+        for field, label in self.FIELD_MAPPING.items():
+            if result.get(field):
+                record[label] = result[field]
+        record.setdefault('sys_id', sys_id)
+        return record
 
     def query_crowdstrike(self, data_list):
         """
-        Iterates through the data_list and performs CrowdStrike queries for each item.
-        Filters items based on the IP pattern.
+        Queries CrowdStrike in batches of IPs for the normalized IPs in data_list.
+        IPs that no device matched are added to crowdstrike_not_found.
         """
+        pending = []
         for item in data_list:
-            if self.ip_pattern.match(item):
-                if item not in self.checked_items:
-                    self.checked_items.add(item)
-                    if not self.cs_query_helper('external_ip', item):
-                        self.crowdstrike_not_found.append({'Data': item})
+            if item not in self.cs_checked_items:
+                self.cs_checked_items.add(item)
+                pending.append(item)
+        cached = self.cache.get_many('crowdstrike', pending) if self.cache else {}
+        results = dict(cached)
+        for batch in self.build_fql_batches('external_ip', [item for item in pending if item not in cached],
+                                            self.cs_filter_length):
+            try:
+                matches = self.cs_query_helper('external_ip', batch)
+            except Exception as e:
+                demisto.log(f'CrowdStrike query for {len(batch)} IPs failed: {str(e)}')
+                self.failed_lookups.extend({'Data': item, 'Source': 'CrowdStrike', 'Reason': str(e)} for item in batch)
+                continue
+            fetched = {item: matches.pop(item, []) for item in batch}
+            demisto.log(f'Queried {len(batch)} IPs in CrowdStrike, {sum(1 for found in fetched.values() if found)} found.')
+            # Devices whose external_ip is not one of the queried IPs are still reported
+            for resources in matches.values():
+                self.crowdstrike_results.extend(resources)
+            if self.cache:
+                self.cache.put_many('crowdstrike', fetched)
+            results.update(fetched)
+
+        for item in pending:
+            if item not in results:
+                continue
+            if results[item]:
+                self.crowdstrike_results.extend(results[item])
+            else:
+                self.crowdstrike_not_found.append({'Data': item})
 
     def query_servicenow(self, data_list):
         """
-        Iterates through the data_list and performs ServiceNow queries for each item.
+        Queries ServiceNow for the items in data_list, batching list queries and fetching each
+        matched record once, using a bounded pool of workers.
         """
+        pending = []
         for item in data_list:
-            if item not in self.checked_items:
-                self.checked_items.add(item)
-                if not self.snow_query_helper('ip_address', item):
-                    self.servicenow_not_found.append({'Data': item})
+            if item not in self.snow_checked_items:
+                self.snow_checked_items.add(item)
+                pending.append(item)
+        cached = self.cache.get_many('servicenow', pending) if self.cache else {}
+        uncached = [item for item in pending if item not in cached]
+        batches = [uncached[start:start + self.snow_batch_size]
+                   for start in range(0, len(uncached), self.snow_batch_size)]
+
+        def attempt(func, *args):
+            # Failures are returned instead of raised so one failed call does not stop the other workers
+            try:
+                return func(*args), None
+            except Exception as e:
+                return None, str(e)
+
+        failed = {}
+        with ThreadPoolExecutor(max_workers=self.snow_workers) as executor:
+            matches = {}
+            batch_results = executor.map(lambda batch: attempt(self.snow_query_helper, 'ip_address', batch), batches)
+            for batch, (batch_matches, error) in zip(batches, batch_results):
+                if error:
+                    failed.update((item, error) for item in batch)
+                    continue
+                for value, sys_ids in batch_matches.items():
+                    matches.setdefault(value, []).extend(sys_ids)
+            # Several IPs can point at the same CI, so each record is fetched once
+            sys_ids = list(dict.fromkeys(sys_id for ids in matches.values() for sys_id in ids))
+            details = dict(zip(sys_ids, executor.map(lambda sys_id: attempt(self.snow_record_details, sys_id), sys_ids)))
+
+        for item in uncached:
+            errors = [details[sys_id][1] for sys_id in matches.get(item, []) if details[sys_id][1]]
+            if errors and item not in failed:
+                failed[item] = errors[0]
+        fetched = {
+            item: [details[sys_id][0] for sys_id in matches.get(item, []) if details[sys_id][0]]
+            for item in uncached if item not in failed
+        }
+        if self.cache:
+            self.cache.put_many('servicenow', fetched)
+        if failed:
+            demisto.log(f'ServiceNow lookups for {len(failed)} IPs failed.')
+            self.failed_lookups.extend(
+                {'Data': item, 'Source': 'ServiceNow', 'Reason': reason} for item, reason in failed.items()
+            )
+        for item in pending:
+            if item in failed:
+                continue
+            records = cached[item] if item in cached else fetched[item]
+            if records:
+                self.servicenow_results.extend(records)
+            else:
+                self.servicenow_not_found.append({'Data': item})
+        demisto.log(f'Queried {len(uncached)} of {len(pending)} IPs in ServiceNow with {len(batches)} list queries '
+                    f'and {len(sys_ids)} record lookups.')
 
     @staticmethod
-    def generate_csv(filename, data):
+    def write_results_file(filename, rows, file_format='csv'):
         """
-        Generates a CSV file from the given data and returns it as a string.
+        Streams rows into a CSV or XLSX file and returns it as a war room file entry.
+        Returns None when there are no rows.
         """
-        output = io.StringIO()
-        writer = csv.DictWriter(output, fieldnames=data[0].keys())
-        writer.writeheader()
-        writer.writerows(data)
-        return output.getvalue()
+        if not rows:
+            return None
+        # Rows from different devices or CIs can carry different fields, so the header is their union
+        fieldnames = list(dict.fromkeys(key for row in rows for key in row))
+        # Written straight to the investigation file path fileResult uses, so the file is never read back into memory
+        file_id = demisto.uniqueFile()
+        path = f"{demisto.investigation()['id']}_{file_id}"
+
+        def cell(value):
+            return json.dumps(value) if isinstance(value, (dict, list)) else value
+
+        try:
+            if file_format == 'xlsx':
+                # constant_memory flushes each row to disk once the next one starts
+                workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'strings_to_urls': False})
+                worksheet = workbook.add_worksheet('Results')
+                worksheet.write_row(0, 0, fieldnames)
+                for row_idx, row in enumerate(rows, start=1):
+                    for col_idx, field in enumerate(fieldnames):
+                        value = cell(row.get(field))
+                        if isinstance(value, str):
+                            value = value[:XLSX_MAX_CELL_LENGTH]
+                        if value is not None:
+                            worksheet.write(row_idx, col_idx, value)
+                workbook.close()
+            else:
+                with open(path, 'w', newline='', encoding='utf-8') as output:
+                    writer = csv.DictWriter(output, fieldnames=fieldnames)
+                    writer.writeheader()
+                    for row in rows:
+                        writer.writerow({key: cell(value) for key, value in row.items()})
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        return {
+            'Contents': '',
+            'ContentsFormat': formats['text'],
+            'Type': entryTypes['file'],
+            'File': filename,
+            'FileID': file_id
+        }
 
 
 class MainApp:
@@ -110,29 +466,79 @@ class MainApp:
     Main application class to orchestrate the data processing and querying.
     """
     def __init__(self):
+        args = demisto.args()
+        # Open the lookup cache unless it is disabled for this run
+        self.cache = None
+        if args.get('use_cache', 'true') != 'false':
+            self.cache = LookupCache(
+                path=args.get('cache_path', CACHE_PATH),
+                positive_ttl=int(args.get('cache_positive_ttl', CACHE_POSITIVE_TTL)),
+                negative_ttl=int(args.get('cache_negative_ttl', CACHE_NEGATIVE_TTL)),
+                max_entries=int(args.get('cache_max_entries', CACHE_MAX_ENTRIES))
+            )
         # Initialize the QueryHelper instance
-        self.helper = QueryHelper()
+        self.helper = QueryHelper(
+            cs_filter_length=int(args.get('cs_filter_length', CS_MAX_FILTER_LENGTH)),
+            snow_batch_size=int(args.get('snow_batch_size', SNOW_BATCH_SIZE)),
+            snow_workers=int(args.get('snow_workers', SNOW_MAX_WORKERS)),
+            cache=self.cache
+        )
 
     def main(self):
         """
         Main method to execute the query and processing logic.
         """
-        input_data = demisto.args().get('data', [])
-        self.helper.query_crowdstrike(input_data)
-        self.helper.query_servicenow(input_data)
+        # Invalid and duplicate entries are dropped before either source is queried
+        input_data, rejected_input, duplicates = self.helper.normalize_input(
+            demisto.args().get('data', []),
+            max_expansion=int(demisto.args().get('max_expansion', MAX_EXPANDED_IPS))
+        )
+        demisto.log(f'Querying {len(input_data)} unique IPs; {len(rejected_input)} entries rejected, '
+                    f'{duplicates} duplicates dropped.')
+        # The two sources are independent, so both phases run at the same time
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            phases = [
+                executor.submit(self.helper.query_crowdstrike, input_data),
+                executor.submit(self.helper.query_servicenow, input_data)
+            ]
+            try:
+                for phase in phases:
+                    phase.result()
+            finally:
+                # The other phase may still be writing to the cache, so it is closed once both have finished
+                wait(phases)
+                if self.cache:
+                    self.cache.close()
 
-        # Clean and deduplicate ServiceNow results
-        servicenow_cleaned = list({v['name']: v for v in self.helper.servicenow_results}.values())
+        # Deduplicate ServiceNow results by name, dropping empty values in the same pass
+        servicenow_cleaned = list({
+            v.get('name', v.get('sys_id')): {k: value for k, value in v.items() if value}
+            for v in self.helper.servicenow_results
+        }.values())
         servicenow_not_found_cleaned = list({v['Data']: v for v in self.helper.servicenow_not_found}.values())
         crowdstrike_not_found_cleaned = list({v['Data']: v for v in self.helper.crowdstrike_not_found}.values())
 
-        # Remove empty values from the ServiceNow results
-        for idx, record in enumerate(servicenow_cleaned):
-            servicenow_cleaned[idx] = {k: v for k, v in record.items() if v}
+        # Stream the results into file entries instead of holding them as strings in context
+        output_format = 'xlsx' if demisto.args().get('output_format') == 'xlsx' else 'csv'
+        snow_file = self.helper.write_results_file(f'snow_results.{output_format}', servicenow_cleaned, output_format)
+        cs_file = self.helper.write_results_file(f'cs_results.{output_format}', self.helper.crowdstrike_results,
+                                                 output_format)
+
+        # Report the entries that were never queried
+        if rejected_input:
+            return_results(CommandResults(
+                outputs={'Queries': {'invalid_input': rejected_input}},
+                raw_response=rejected_input,
+                readable_output=tableToMarkdown('Rejected Input', rejected_input)
+            ))
 
-        # Generate CSV files for the results
-        snow_csv = self.helper.generate_csv('snow_results.csv', servicenow_cleaned)
-        cs_csv = self.helper.generate_csv('cs_results.csv', self.helper.crowdstrike_results)
+        # Report the IPs whose lookup failed; they were not cached and are queried again next run
+        if self.helper.failed_lookups:
+            return_results(CommandResults(
+                outputs={'Queries': {'failed_lookups': self.helper.failed_lookups}},
+                raw_response=self.helper.failed_lookups,
+                readable_output=tableToMarkdown('Failed Lookups', self.helper.failed_lookups)
+            ))
 
         # Prepare results for CrowdStrike not found
         cs_not_found_markdown = tableToMarkdown('Not Found in CrowdStrike', crowdstrike_not_found_cleaned)
@@ -148,11 +554,14 @@ class MainApp:
         snow_not_found_markdown = 'Not Found in ServiceNow CMDB\n' + tableToMarkdown('Not Found in ServiceNow CMDB', servicenow_not_found_cleaned)
         overall_results = {
             'Queries': {
-                'snow_csv_file': snow_csv,
-                'cs_csv_file': cs_csv,
-                'servicenow_results': servicenow_cleaned,
+                'snow_results_file': snow_file['File'] if snow_file else None,
+                'cs_results_file': cs_file['File'] if cs_file else None,
+                # The full records are in the results file, so context keeps only what identifies each CI
+                'servicenow_results': [
+                    {'name': record.get('name'), 'sys_id': record.get('sys_id')} for record in servicenow_cleaned
+                ],
                 'snow_not_found': servicenow_not_found_cleaned,
-                'checked_items': list(self.helper.checked_items)
+                'checked_items': sorted(self.helper.cs_checked_items | self.helper.snow_checked_items)
             }
         }
         command_results_snow = CommandResults(
@@ -160,9 +569,19 @@ class MainApp:
         )
         return_results(command_results_snow)
 
+        # Report how many lookups the cache answered
+        if self.cache:
+            cache_stats = [{'Source': source, **counts} for source, counts in sorted(self.cache.stats.items())]
+            return_results(CommandResults(
+                outputs={'Queries': {'cache_stats': cache_stats}},
+                raw_response=cache_stats,
+                readable_output=tableToMarkdown('Lookup Cache', cache_stats)
+            ))
+
         # Output the final results
-        demisto.results(snow_csv)
-        demisto.results(cs_csv)
+        for file_entry in (snow_file, cs_file):
+            if file_entry:
+                demisto.results(file_entry)
         demisto.results('Finished executing all commands.')
 
 
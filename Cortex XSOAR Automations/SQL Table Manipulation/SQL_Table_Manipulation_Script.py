@@ -1,7 +1,17 @@
-from typing import Dict, Any
+from typing import Dict, Any, List
+import json
+import re
+import time
+from datetime import date
 import traceback
 import logging
 
+# YAML table specs are optional; JSON specs work without PyYAML installed
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
 # Set up logging at the INFO level
 logging.basicConfig(level=logging.INFO)
 
@@ -14,6 +24,18 @@ class TableManager:
         self.table_name = args.get('tableName')
         self.headers = args.get('headers')
         self.command = args.get('command', 'CREATE')
+        # Optional key, index and partition settings used by CREATE and the index/partition commands
+        self.primary_key = args.get('primaryKey')
+        self.indexes = args.get('indexes')
+        self.index_name = args.get('indexName')
+        self.partition_column = args.get('partitionColumn')
+        self.partition_interval = str(args.get('partitionInterval', 'MONTH')).upper()
+        self.partition_start = args.get('partitionStart')
+        self.partition_end = args.get('partitionEnd')
+        # MIGRATE only drops columns missing from the headers when asked to, since that loses data
+        self.drop_columns = str(args.get('dropColumns', 'false')).lower() == 'true'
+        # Return the generated query without executing it
+        self.dry_run = str(args.get('dryRun', 'false')).lower() == 'true'
 
         # Validate the arguments
         self.validate_arguments()
@@ -26,44 +48,269 @@ class TableManager:
             raise ValueError("Table name must be provided.")
         # Raise an error if headers are not provided for the CREATE command
         # This is necessary because the headers define the structure of the table
-        if not self.headers and self.command == 'CREATE':
-            raise ValueError("Headers must be provided for CREATE command.")
+        if not self.headers and self.command in ('CREATE', 'MIGRATE'):
+            raise ValueError(f"Headers must be provided for {self.command} command.")
+        # Raise an error if the index commands are missing what they act on
+        if not self.indexes and self.command == 'CREATE_INDEX':
+            raise ValueError("Indexes must be provided for CREATE_INDEX command.")
+        if not self.index_name and self.command == 'DROP_INDEX':
+            raise ValueError("Index name must be provided for DROP_INDEX command.")
+        # Raise an error if partitioning is requested without a complete date range
+        if self.partition_column or self.command == 'PARTITION':
+            if not (self.partition_column and self.partition_start and self.partition_end):
+                raise ValueError("Partition column, start and end must be provided for partitioning.")
+            if self.partition_interval not in ('MONTH', 'YEAR'):
+                raise ValueError("Partition interval must be MONTH or YEAR.")
+            # MySQL requires every unique key of a partitioned table to contain the partition column
+            unique_keys = [self.parse_column_list(self.primary_key)] if self.primary_key else []
+            unique_keys += [columns for unique, name, columns in self.parse_indexes() if unique]
+            if any(self.partition_column not in columns for columns in unique_keys):
+                raise ValueError("The partition column must be part of the primary key and every unique index.")
     
     # Parse the headers
     def parse_headers(self):
         headers = {}
         # Split the headers by comma and space, and assign a default type if not provided
         # This is done to allow the headers to be specified in a compact format
-        for header in self.headers.split(','):
+        # Batch specs may already give the headers as a list
+        header_items = self.headers if isinstance(self.headers, list) else self.headers.split(',')
+        for header in header_items:
             name, *type_info = header.strip().split()
             data_type = ' '.join(type_info) if type_info else 'varchar(255)'
             headers[name] = data_type
         return headers
 
+    # Parse a comma separated column list
+    @staticmethod
+    def parse_column_list(columns):
+        if isinstance(columns, list):
+            return [str(column).strip() for column in columns if str(column).strip()]
+        return [column.strip() for column in str(columns).split(',') if column.strip()]
+
+    # Parse the index definitions
+    def parse_indexes(self):
+        indexes = []
+        if not self.indexes:
+            return indexes
+        # Indexes are separated by semicolons, e.g. "idx_severity(severity); UNIQUE idx_asset(asset_id, scan_date)"
+        # Batch specs may already give the indexes as a list
+        index_items = self.indexes if isinstance(self.indexes, list) else self.indexes.split(';')
+        for item in index_items:
+            item = item.strip()
+            if not item:
+                continue
+            match = re.match(r'^(UNIQUE\s+)?(\w+)\s*\((.+)\)$', item, re.IGNORECASE)
+            if match:
+                unique, name, columns = bool(match.group(1)), match.group(2), self.parse_column_list(match.group(3))
+            else:
+                # A bare column list gets a name derived from its columns
+                unique, columns = False, self.parse_column_list(item)
+                name = 'idx_' + '_'.join(columns)
+            indexes.append((unique, name, columns))
+        return indexes
+
+    # Generate the index clauses shared by CREATE TABLE and ALTER TABLE
+    def generate_index_clauses(self, prefix=''):
+        clauses = []
+        for unique, name, columns in self.parse_indexes():
+            kind = 'UNIQUE INDEX' if unique else 'INDEX'
+            clauses.append(f'{prefix}{kind} {name} ({", ".join(columns)})')
+        return clauses
+
+    # Generate the partition clause for a date range
+    def generate_partition_clause(self):
+        start = date.fromisoformat(str(self.partition_start)[:10])
+        end = date.fromisoformat(str(self.partition_end)[:10])
+        # Each partition holds one interval, from the one containing partitionStart to the one containing partitionEnd
+        current = date(start.year, 1, 1) if self.partition_interval == 'YEAR' else date(start.year, start.month, 1)
+        partitions = []
+        while current <= end:
+            if self.partition_interval == 'YEAR':
+                boundary = date(current.year + 1, 1, 1)
+                name = f'p{current.year}'
+            else:
+                boundary = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+                name = f'p{current.year}{current.month:02d}'
+            partitions.append(f"PARTITION {name} VALUES LESS THAN ('{boundary.isoformat()}')")
+            current = boundary
+        # Rows past the last interval land in a catch-all partition
+        partitions.append('PARTITION pmax VALUES LESS THAN (MAXVALUE)')
+        return f'PARTITION BY RANGE COLUMNS({self.partition_column}) ({", ".join(partitions)})'
+
     # Generate a CREATE TABLE query
     def generate_create_query(self):
         headers = self.parse_headers()
         # Generate the column definitions for the SQL query
         columns = [f'{name} {data_type}' for name, data_type in headers.items()]
+        if self.primary_key:
+            columns.append(f'PRIMARY KEY ({", ".join(self.parse_column_list(self.primary_key))})')
+        columns += self.generate_index_clauses()
         joined_columns = ', '.join(columns)
-        return f'CREATE TABLE {self.table_name} ({joined_columns})'
+        query = f'CREATE TABLE {self.table_name} ({joined_columns})'
+        if self.partition_column:
+            query += f' {self.generate_partition_clause()}'
+        return query
+
+    # Generate an ALTER TABLE query that adds the indexes
+    def generate_create_index_query(self):
+        return f'ALTER TABLE {self.table_name} {", ".join(self.generate_index_clauses("ADD "))}'
+
+    # Generate an ALTER TABLE query that drops an index
+    def generate_drop_index_query(self):
+        return f'ALTER TABLE {self.table_name} DROP INDEX {self.index_name}'
+
+    # Generate an ALTER TABLE query that partitions an existing table
+    def generate_partition_query(self):
+        return f'ALTER TABLE {self.table_name} {self.generate_partition_clause()}'
+
+    # Generate an ANALYZE TABLE query so the optimizer has fresh statistics
+    def generate_analyze_query(self):
+        return f'ANALYZE TABLE {self.table_name}'
 
     # Generate a DROP TABLE query
     def generate_drop_query(self):
         return f'DROP TABLE IF EXISTS {self.table_name}'
     
-    # Execute the command
-    def execute(self):
-        query = ""
+    # Normalize a column type so equivalent spellings compare equal
+    @staticmethod
+    def normalize_type(data_type):
+        data_type = re.sub(r'\s+', ' ', str(data_type).strip().lower())
+        data_type = re.sub(r'\s*\(\s*', '(', data_type)
+        data_type = re.sub(r'\s*,\s*', ',', data_type)
+        data_type = re.sub(r'\s*\)', ')', data_type)
+        data_type = re.sub(r'^integer\b', 'int', data_type)
+        data_type = re.sub(r'^bool(ean)?\b', 'tinyint(1)', data_type)
+        # MySQL 5.7 reports display widths such as int(11); MySQL 8 does not
+        data_type = re.sub(r'^(tinyint|smallint|mediumint|int|bigint)\((?!1\))\d+\)', r'\1', data_type)
+        return data_type
+
+    # Split a header definition into its type and its declared nullability: True for NOT NULL, False for NULL, None if unset
+    @staticmethod
+    def split_definition(data_type):
+        # Key constraints already exist on the live table and cannot be repeated in MODIFY COLUMN
+        definition = re.sub(r'\b(PRIMARY\s+KEY|UNIQUE(\s+KEY)?)\b', '', data_type, flags=re.IGNORECASE).strip()
+        if re.search(r'\bNOT\s+NULL\b', definition, re.IGNORECASE):
+            not_null = True
+        elif re.search(r'\bNULL\b', re.sub(r'\bDEFAULT\s+NULL\b', '', definition, flags=re.IGNORECASE), re.IGNORECASE):
+            not_null = False
+        else:
+            not_null = None
+        # The type is everything before the first modifier keyword
+        type_only = re.split(r'\s+(?:NOT\s+NULL|NULL|DEFAULT|AUTO_INCREMENT|COMMENT|COLLATE|CHARACTER\s+SET)\b',
+                             definition, maxsplit=1, flags=re.IGNORECASE)[0]
+        return definition, type_only, not_null
+
+    # Read the current columns of the table from information_schema
+    def fetch_current_schema(self):
+        query = (
+            'SELECT COLUMN_NAME AS name, COLUMN_TYPE AS type, IS_NULLABLE AS nullable, '
+            'COLUMN_DEFAULT AS default_value, EXTRA AS extra '
+            'FROM information_schema.COLUMNS '
+            f"WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = '{self.table_name}' "
+            'ORDER BY ORDINAL_POSITION'
+        )
+        logging.info(f"Executing query: {query}")
+        response = execute_command('asset-query-sql', {'query': query})
+        rows = response if isinstance(response, list) else []
+        current = {}
+        for row in rows:
+            if isinstance(row, dict):
+                name, data_type, nullable = row.get('name'), row.get('type'), row.get('nullable')
+                default, extra = row.get('default_value'), row.get('extra')
+            else:
+                name, data_type, nullable, default, extra = row[0], row[1], row[2], row[3], row[4]
+            current[name] = (data_type, str(nullable).upper() == 'YES', default, extra or '')
+        if not current:
+            raise ValueError(f"Table {self.table_name} does not exist; use CREATE instead of MIGRATE.")
+        return current
+
+    # Add the NOT NULL, DEFAULT and AUTO_INCREMENT settings of the live column that the header does not override
+    @staticmethod
+    def carry_attributes(definition, not_null, nullable, default, extra):
+        if not_null is None and not nullable:
+            definition += ' NOT NULL'
+        if default is not None and not re.search(r'\bDEFAULT\b', definition, re.IGNORECASE):
+            default = str(default)
+            if 'DEFAULT_GENERATED' in extra.upper() or re.match(r'^CURRENT_TIMESTAMP(\(\d*\))?$', default, re.IGNORECASE):
+                # Expression defaults are reported without parentheses, which only CURRENT_TIMESTAMP can do without
+                is_timestamp = re.match(r'^CURRENT_TIMESTAMP\b', default, re.IGNORECASE)
+                definition += f' DEFAULT {default}' if is_timestamp else f' DEFAULT ({default})'
+            else:
+                escaped = default.replace('\\', '\\\\').replace("'", "''")
+                definition += f" DEFAULT '{escaped}'"
+        if 'AUTO_INCREMENT' in extra.upper() and not re.search(r'\bAUTO_INCREMENT\b', definition, re.IGNORECASE):
+            definition += ' AUTO_INCREMENT'
+        on_update = re.search(r'\bON UPDATE (\S+)', extra, re.IGNORECASE)
+        if on_update and not re.search(r'\bON\s+UPDATE\b', definition, re.IGNORECASE):
+            definition += f' ON UPDATE {on_update.group(1)}'
+        return definition
+
+    # Generate the minimal ALTER TABLE query that brings the table in line with the headers
+    def generate_migrate_query(self):
+        current = self.fetch_current_schema()
+        current_lower = {name.lower(): name for name in current}
+        headers = self.parse_headers()
+        changes = []
+        previous = None
+        for name, data_type in headers.items():
+            definition, type_only, not_null = self.split_definition(data_type)
+            existing = current_lower.get(name.lower())
+            if existing is None:
+                # New columns keep the position they have in the headers
+                position = f' AFTER {previous}' if previous else ' FIRST'
+                changes.append(f'ADD COLUMN {name} {definition}{position}')
+            else:
+                current_type, nullable, default, extra = current[existing]
+                type_changed = self.normalize_type(type_only) != self.normalize_type(current_type)
+                # A nullability the header states explicitly is a change in either direction
+                nullability_changed = not_null is not None and not_null == nullable
+                if type_changed or nullability_changed:
+                    # MODIFY COLUMN replaces the whole definition, so settings the header leaves out are carried over
+                    definition = self.carry_attributes(definition, not_null, nullable, default, extra)
+                    changes.append(f'MODIFY COLUMN {name} {definition}')
+            previous = name
+        removed = [name for name in current if name.lower() not in {header.lower() for header in headers}]
+        if removed:
+            if self.drop_columns:
+                changes += [f'DROP COLUMN {name}' for name in removed]
+            else:
+                logging.info(f"Columns not in headers were kept: {', '.join(removed)}")
+        if not changes:
+            return None
+        return f'ALTER TABLE {self.table_name} {", ".join(changes)}'
+
+    # Generate the query for the command
+    def generate_query(self):
         # Generate the appropriate query based on the command
         # This allows the class to support multiple commands
         if self.command == 'CREATE':
-            query = self.generate_create_query()
+            return self.generate_create_query()
         elif self.command == 'DROP':
-            query = self.generate_drop_query()
+            return self.generate_drop_query()
+        elif self.command == 'CREATE_INDEX':
+            return self.generate_create_index_query()
+        elif self.command == 'DROP_INDEX':
+            return self.generate_drop_index_query()
+        elif self.command == 'PARTITION':
+            return self.generate_partition_query()
+        elif self.command == 'ANALYZE':
+            return self.generate_analyze_query()
+        elif self.command == 'MIGRATE':
+            return self.generate_migrate_query()
         else:
             raise ValueError('Unsupported SQL command')
 
+    # Execute the command
+    def execute(self):
+        query = self.generate_query()
+        # MIGRATE has nothing to run when the table already matches the headers
+        if query is None:
+            return_results(f'Table {self.table_name} already matches the requested headers.')
+            return
+        if self.dry_run:
+            return_results(query)
+            return
+
         # Try to execute the query and handle any exceptions
         # This is done to provide a useful error message if the query fails
         try:
@@ -74,11 +321,115 @@ class TableManager:
             demisto.error(traceback.format_exc())
             return_error(f'Failed to execute BaseScript. Error: {str(ex)}')
 
+# Define the BatchTableManager class
+class BatchTableManager:
+    # Initialize the class with arguments
+    def __init__(self, args: Dict[str, Any]):
+        # The table specs can be given as a JSON or YAML list, or as an already parsed list
+        self.specs = self.parse_specs(args.get('tables'))
+        # 'auto' tries one call for all statements and falls back to one call per statement
+        self.execution = args.get('batchExecution', 'auto')
+        # Build a TableManager per spec so each spec is validated the same way as a single command
+        self.managers = [TableManager(spec) for spec in self.specs]
+
+    # Parse the table specs
+    @staticmethod
+    def parse_specs(raw_specs) -> List[Dict[str, Any]]:
+        if not raw_specs:
+            raise ValueError("Table specs must be provided for BATCH command.")
+        if isinstance(raw_specs, list):
+            specs = raw_specs
+        else:
+            try:
+                specs = json.loads(raw_specs)
+            except ValueError:
+                if yaml is None:
+                    raise ValueError("Table specs are not valid JSON and PyYAML is not installed.")
+                specs = yaml.safe_load(raw_specs)
+        if isinstance(specs, dict):
+            specs = specs.get('tables', [specs])
+        if not isinstance(specs, list) or not all(isinstance(spec, dict) for spec in specs):
+            raise ValueError("Table specs must be a list of objects.")
+        return specs
+
+    # Generate the DDL for every spec
+    def generate_queries(self) -> List[str]:
+        queries = [manager.generate_query() for manager in self.managers]
+        # Migrations with nothing to change generate no statement
+        return [query for query in queries if query]
+
+    # Execute all statements in a single asset-query-sql call
+    def execute_single(self, queries):
+        start = time.perf_counter()
+        response = execute_command('asset-query-sql', {'query': ';\n'.join(queries) + ';'})
+        elapsed = time.perf_counter() - start
+        # One round trip cannot be timed per statement, so the total is reported on the first row
+        return [
+            {'Statement': query, 'Status': 'OK', 'Seconds': round(elapsed, 3) if idx == 0 else None}
+            for idx, query in enumerate(queries)
+        ], response
+
+    # Execute each statement in its own asset-query-sql call so each one is timed
+    def execute_separate(self, queries):
+        timings = []
+        responses = []
+        for query in queries:
+            start = time.perf_counter()
+            try:
+                logging.info(f"Executing query: {query}")
+                responses.append(execute_command('asset-query-sql', {'query': query}))
+                status = 'OK'
+            except Exception as ex:
+                demisto.error(traceback.format_exc())
+                status = f'Failed: {str(ex)}'
+            timings.append({'Statement': query, 'Status': status, 'Seconds': round(time.perf_counter() - start, 3)})
+        return timings, responses
+
+    # Check whether the connection accepts several statements in one call without running any DDL
+    @staticmethod
+    def supports_multi_statements():
+        try:
+            execute_command('asset-query-sql', {'query': 'SELECT 1;\nSELECT 1;'})
+            return True
+        except Exception as ex:
+            # Multi-statement queries are not allowed by every database connection
+            logging.info(f"Multi-statement queries are not supported, executing statements separately: {str(ex)}")
+            return False
+
+    # Execute the batch
+    def execute(self):
+        queries = self.generate_queries()
+        # Every spec can be a MIGRATE that is already up to date, which leaves nothing to send
+        if not queries:
+            return_results('No statements to execute; every table already matches its spec.')
+            return
+        if self.execution == 'single' or (self.execution == 'auto' and self.supports_multi_statements()):
+            try:
+                logging.info(f"Executing {len(queries)} statements in one call")
+                timings, responses = self.execute_single(queries)
+            except Exception as ex:
+                demisto.error(traceback.format_exc())
+                if self.execution == 'single':
+                    return_error(f'Failed to execute batch. Error: {str(ex)}')
+                # Statements before the failing one have already run, so none of them is executed again
+                timings = [{'Statement': query, 'Status': f'Unknown: {str(ex)}', 'Seconds': None} for query in queries]
+                responses = None
+        else:
+            timings, responses = self.execute_separate(queries)
+
+        readable = tableToMarkdown(f'Executed {len(queries)} statements', timings, headers=['Statement', 'Status', 'Seconds'])
+        return_results(CommandResults(
+            outputs_prefix='TableManager.Batch', outputs=timings, raw_response=responses, readable_output=readable
+        ))
+
 # Define the main function
 def main(arguments):
     # Create an instance of TableManager and execute the command
     # This is done to encapsulate the functionality in a class and make the code more modular
-    table_manager = TableManager(arguments)
+    if arguments.get('command') == 'BATCH':
+        table_manager = BatchTableManager(arguments)
+    else:
+        table_manager = TableManager(arguments)
     table_manager.execute()
 
 # Execute the main function if the script is run directly
@@ -1,8 +1,47 @@
 import csv
+import hashlib
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime
+from itertools import chain, islice
 import demisto_sdk as demisto
-import pandas as pd
+import openpyxl
 import os
 
+# Rows per multi-row INSERT statement
+DEFAULT_BATCH_SIZE = 1000
+# Concurrent chunk loads, retries per failed chunk and the base delay between retries
+DEFAULT_WORKERS = 4
+DEFAULT_CHUNK_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 2
+# Chunks between progress entries in the war room
+DEFAULT_PROGRESS_INTERVAL = 50
+# Suffixes for the table loaded in the background and the table it replaces
+SHADOW_SUFFIX = '_shadow'
+OLD_SUFFIX = '_old'
+# Delta imports keep one hash per primary key in this companion table
+HASH_SUFFIX = '_row_hashes'
+# Columns tried, in order, when no keyColumn argument is given
+KEY_COLUMN_CANDIDATES = ['Issue ID', 'Finding ID', 'Resource ID', 'ID']
+# Rows read ahead of the import to infer column types
+DEFAULT_SAMPLE_SIZE = 1000
+# Known values of the Wiz columns with exactly these headers; values seen in the sample are added to these
+ENUM_COLUMN_VALUES = {
+    'severity': ['INFORMATIONAL', 'LOW', 'MEDIUM', 'HIGH', 'CRITICAL'],
+    'status': ['OPEN', 'IN_PROGRESS', 'RESOLVED', 'REJECTED'],
+}
+# Columns whose names contain one of these get a secondary index
+INDEXED_COLUMN_KEYWORDS = ['severity', 'status', 'resource id', 'resource external id', 'issue id', 'subscription id']
+# Longest sampled value that still gets a VARCHAR; longer columns become TEXT
+MAX_VARCHAR_LENGTH = 1024
+# Largest values of the INT and BIGINT columns, and the bytes a TEXT column holds
+MAX_INT = 2 ** 31 - 1
+MAX_BIGINT = 2 ** 63 - 1
+MAX_TEXT_BYTES = 65535
+INT_PATTERN = re.compile(r'^-?(0|[1-9]\d*)$')
+FLOAT_PATTERN = re.compile(r'^-?\d+\.\d+$')
+
 class DataImporter:
     """
     Class to handle the import of data from CSV or Excel files into a SQL table.
@@ -24,16 +63,58 @@ class DataImporter:
         self.args = demisto.args()
         self.tableName = self.args.get('dbTable')
         self.fileLocation = None
+        self.fileName = None
+        self.batchSize = int(self.args.get('batchSize', DEFAULT_BATCH_SIZE))
+        self.importMethod = self.args.get('importMethod', 'insert')
+        self.importMode = self.args.get('importMode', 'swap')
+        self.allowEmpty = str(self.args.get('allowEmpty', 'false')).lower() == 'true'
+        self.keyColumn = self.args.get('keyColumn')
+        self.sampleSize = int(self.args.get('sampleSize', DEFAULT_SAMPLE_SIZE))
+        self.workers = max(1, int(self.args.get('workers', DEFAULT_WORKERS)))
+        self.chunkRetries = int(self.args.get('chunkRetries', DEFAULT_CHUNK_RETRIES))
+        self.progressInterval = max(1, int(self.args.get('progressInterval', DEFAULT_PROGRESS_INTERVAL)))
+        self.columnTypes = None
+        self.enumMembers = {}
+        self.rowHashes = None
 
-    def remove_table(self):
+    def run_query(self, query):
+        """
+        Runs a query through asset-query-sql and raises if the command returned an error entry.
         """
-        Drops the existing SQL table if it exists.
+        res = demisto.executeCommand('asset-query-sql', {'query': query})
+        if is_error(res):
+            raise Exception(get_error(res))
+        return res
+
+    def remove_table(self, table):
+        """
+        Drops the given SQL table if it exists.
         """
         try:
-            demisto.executeCommand('asset-query-sql', {'query': f'DROP TABLE IF EXISTS {self.tableName}'})
-            self.add_debug_log(f'Table {self.tableName} dropped.')
+            self.run_query(f'DROP TABLE IF EXISTS {table}')
+            self.add_debug_log(f'Table {table} dropped.')
         except Exception as e:
-            self.add_debug_log(f'Failed to drop table {self.tableName}. Error: {str(e)}')
+            self.add_debug_log(f'Failed to drop table {table}. Error: {str(e)}')
+
+    def table_exists(self, table):
+        """
+        Checks whether the given SQL table exists.
+        """
+        res = self.run_query(f"SHOW TABLES LIKE '{table}'")
+        contents = res[0].get('Contents')
+        return isinstance(contents, list) and len(contents) > 0
+
+    def count_rows(self, table):
+        """
+        Returns the number of rows in the given SQL table.
+        """
+        res = self.run_query(f'SELECT COUNT(*) FROM {table}')
+        row = res[0]['Contents'][0]
+        if isinstance(row, dict):
+            row = list(row.values())
+        if isinstance(row, (list, tuple)):
+            row = row[0]
+        return int(row)
 
     def process_entry_id(self):
         """
@@ -45,6 +126,7 @@ class DataImporter:
             self.add_debug_log('getFilePath response for entryId received.')
             try:
                 self.fileLocation = res[0]['Contents']['path']
+                self.fileName = res[0]['Contents'].get('name', self.fileLocation)
                 self.add_debug_log('File path retrieved successfully.')
             except KeyError as e:
                 self.add_debug_log('Failed to retrieve file path from getFilePath response.')
@@ -52,103 +134,676 @@ class DataImporter:
 
     def process_file_extension(self):
         """
-        Checks the file extension and processes accordingly.
+        Checks the file extension is one the importer can read.
         """
         try:
-            extension = res[0]['Contents']['name'].split('.')[-1]
-            if extension not in ['csv', 'xlsx']:
-                self.add_debug_log(f'Unsupported file extension: {extension}')
-                return 'File type not supported.'
-            if extension == 'xlsx':
-                newFile = pd.read_excel(self.fileLocation)
-                csvOutput = newFile.to_csv(index=False)
-                with open('table.csv', 'w') as csv_file:
-                    csv_file.write(csvOutput)
-                self.fileLocation = 'table.csv'
+            self.extension = self.fileName.split('.')[-1].lower()
+            if self.extension not in ['csv', 'xlsx']:
+                self.add_debug_log(f'Unsupported file extension: {self.extension}')
+                demisto.return_error('File type not supported.')
         except Exception as e:
             self.add_debug_log(f'Error processing file extension: {str(e)}')
             demisto.return_error('Error processing file extension.')
 
+    def read_rows(self):
+        """
+        Yields the header row and then each data row of the file as lists of strings.
+        """
+        if self.extension == 'xlsx':
+            # Read-only mode streams rows from the sheet XML instead of loading the whole workbook
+            workbook = openpyxl.load_workbook(self.fileLocation, read_only=True, data_only=True)
+            try:
+                for row in workbook.worksheets[0].iter_rows(values_only=True):
+                    if any(value is not None for value in row):
+                        yield [self.cell_to_string(value) for value in row]
+            finally:
+                workbook.close()
+        else:
+            with open(self.fileLocation, 'r', newline='') as file:
+                yield from csv.reader(file)
+
+    @staticmethod
+    def cell_to_string(value):
+        """
+        Renders a cell value the way it would appear in a CSV export.
+        """
+        if value is None:
+            return ''
+        if isinstance(value, datetime):
+            return value.isoformat(sep=' ')
+        if isinstance(value, date):
+            return value.isoformat()
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
+
     def open_file(self):
         """
-        Opens the CSV file for reading.
+        Opens the file and reads its header row.
         """
         try:
-            with open(self.fileLocation, 'r') as file:
-                self.csvData = csv.reader(file)
-                self.add_debug_log('CSV file opened successfully.')
+            self.rows = self.read_rows()
+            headers = [str(header).strip() for header in next(self.rows)]
+            # Keep a sample for schema inference and put it back in front of the remaining rows
+            sample = list(islice(self.rows, self.sampleSize))
+            self.headers = self.name_headers(headers, sample)
+            self.sampleRows = [self.pad_row(row) for row in sample]
+            self.rows = chain(self.sampleRows, self.rows)
+            self.add_debug_log(f'File opened successfully with {len(self.headers)} columns.')
         except Exception as e:
             self.add_debug_log(f'Failed to open file: {str(e)}')
             demisto.return_error('Failed to open file.')
 
-    def process_wiz_report(self):
+    @staticmethod
+    def name_headers(headers, sample):
         """
-        Processes the Wiz report data.
+        Drops trailing blank header columns with no sampled values and names the remaining blank headers.
         """
-        try:
-            self.processedData = [row for row in self.csvData]
-            self.add_debug_log('Wiz report processed successfully.')
-        except Exception as e:
-            self.add_debug_log(f'Error processing Wiz report: {str(e)}')
-            demisto.return_error('Error processing Wiz report.')
+        # Read-only XLSX rows are padded to the sheet dimension, so formatted empty cells show up as blank headers
+        while headers and not headers[-1] and not any(
+            len(row) >= len(headers) and str(row[len(headers) - 1]).strip() for row in sample
+        ):
+            headers = headers[:-1]
+        return [header or f'Unnamed: {idx}' for idx, header in enumerate(headers)]
 
-    def save_file(self):
+    @staticmethod
+    def quote_identifier(name):
+        """
+        Quotes a column or index name for MySQL.
         """
-        Saves the processed data to a CSV file.
+        return '`' + str(name).replace('`', '``') + '`'
+
+    @staticmethod
+    def parse_datetime(value):
+        """
+        Parses ISO-8601 dates and timestamps as exported by Wiz, returning None for anything else.
         """
         try:
-            with open('processed_data.csv', 'w') as file:
-                writer = csv.writer(file)
-                writer.writerows(self.processedData)
-                self.fileLocation = 'processed_data.csv'
-                self.add_debug_log('Processed data saved to CSV file.')
-        except Exception as e:
-            self.add_debug_log(f'Failed to save processed data: {str(e)}')
-            demisto.return_error('Failed to save processed data.')
+            parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        if parsed.tzinfo is not None:
+            parsed = parsed.replace(tzinfo=None) - parsed.utcoffset()
+        return parsed
 
-    def build_table(self):
+    def infer_column_type(self, header, values):
+        """
+        Picks a MySQL column type for a column from its sampled values.
+        """
+        values = [value.strip() for value in values if value.strip()]
+        lowered = header.strip().lower()
+        if lowered in ENUM_COLUMN_VALUES:
+            # MySQL compares ENUM members without case, so values are folded to upper case
+            members = list(dict.fromkeys(ENUM_COLUMN_VALUES[lowered] + sorted(set(value.upper() for value in values))))
+            self.enumMembers[header] = set(members)
+            return 'enum', 'ENUM(' + ', '.join(self.sql_literal(member) for member in members) + ')'
+        if not values:
+            return 'string', 'VARCHAR(255)'
+        if all(INT_PATTERN.match(value) for value in values):
+            if all(abs(int(value)) <= MAX_INT for value in values):
+                return 'int', 'INT'
+            return 'int', 'BIGINT'
+        if all(INT_PATTERN.match(value) or FLOAT_PATTERN.match(value) for value in values):
+            return 'float', 'DOUBLE'
+        if all(len(value) >= 10 and self.parse_datetime(value) for value in values):
+            if all(len(value) == 10 for value in values):
+                return 'date', 'DATE'
+            return 'datetime', 'DATETIME'
+        longest = max(len(value) for value in values)
+        if longest * 2 > MAX_VARCHAR_LENGTH:
+            return 'string', 'TEXT'
+        # Leave headroom over the sample so longer values later in the file still fit
+        size = 32
+        while size < longest * 2:
+            size *= 2
+        return 'string', f'VARCHAR({size})'
+
+    def infer_schema(self):
+        """
+        Infers the column types from the sampled rows.
+        """
+        if self.uses_load_data():
+            # LOAD DATA cannot convert values, so every column stays a string
+            self.columnTypes = [
+                ('string', 'TEXT' if any(len(row[idx]) * 2 > MAX_VARCHAR_LENGTH for row in self.sampleRows) else 'VARCHAR(255)')
+                for idx in range(len(self.headers))
+            ]
+        else:
+            self.columnTypes = [
+                self.infer_column_type(header, [str(row[idx]) for row in self.sampleRows])
+                for idx, header in enumerate(self.headers)
+            ]
+        self.add_debug_log('Inferred schema: ' + ', '.join(
+            f'{header} {sql_type}' for header, (kind, sql_type) in zip(self.headers, self.columnTypes)
+        ))
+
+    def get_table_schema(self, table):
+        """
+        Builds the CREATE TABLE statement from the inferred column types.
+        """
+        if self.columnTypes is None:
+            self.infer_schema()
+        columns = ', '.join(
+            f'{self.quote_identifier(header)} {sql_type}' for header, (kind, sql_type) in zip(self.headers, self.columnTypes)
+        )
+        return f'CREATE TABLE {table} ({columns})'
+
+    def build_table(self, table):
         """
         Builds the SQL table structure.
         """
+        table_schema = self.get_table_schema(table)
+        self.run_query(table_schema)
+        self.add_debug_log(f'Table {table} schema created.')
+
+    def create_indexes(self, table):
+        """
+        Adds secondary indexes on the commonly filtered columns once the table is loaded.
+        """
+        indexes = []
+        for idx, header in enumerate(self.headers):
+            lowered = header.lower()
+            is_key = self.keyColumn and lowered == self.keyColumn.strip().lower()
+            if not is_key and not any(keyword in lowered for keyword in INDEXED_COLUMN_KEYWORDS):
+                continue
+            # TEXT columns can only be indexed on a prefix
+            prefix = '(191)' if self.columnTypes[idx][1] in ('TEXT', 'MEDIUMTEXT') else ''
+            index_name = 'idx_' + re.sub(r'\W+', '_', lowered).strip('_')[:60]
+            indexes.append(f'ADD INDEX {self.quote_identifier(index_name)} ({self.quote_identifier(header)}{prefix})')
+        if indexes:
+            self.run_query(f'ALTER TABLE {table} ' + ', '.join(indexes))
+            self.add_debug_log(f'Created {len(indexes)} indexes on {table}.')
+
+    @staticmethod
+    def sql_literal(value):
+        """
+        Renders a value as an escaped SQL string literal, or NULL for empty values.
+        """
+        if value is None or value == '':
+            return 'NULL'
+        escaped = str(value).replace('\\', '\\\\').replace("'", "\\'")
+        return f"'{escaped}'"
+
+    def build_insert_query(self, table, rows, headers=None):
+        """
+        Builds one multi-row INSERT statement for a batch of rows.
+        """
+        headers = headers or self.headers
+        columns = ', '.join(self.quote_identifier(header) for header in headers)
+        values = ',\n'.join(
+            '(' + ', '.join(self.sql_literal(value) for value in row) + ')' for row in rows
+        )
+        return f'INSERT INTO {table} ({columns}) VALUES\n{values}'
+
+    def pad_row(self, row):
+        """
+        Trims or pads a row so it matches the number of header columns.
+        """
+        row = list(row)[:len(self.headers)]
+        return row + [''] * (len(self.headers) - len(row))
+
+    def widen_column(self, table, idx, kind, sql_type):
+        """
+        Changes the type of a column whose values outgrew the type inferred from the sample.
+        """
+        header = self.headers[idx]
+        self.run_query(f'ALTER TABLE {table} MODIFY COLUMN {self.quote_identifier(header)} {sql_type}')
+        self.columnTypes[idx] = (kind, sql_type)
+        self.add_debug_log(f'Widened column {header} of {table} to {sql_type}.')
+
+    def convert_value(self, value, idx, table):
+        """
+        Converts a raw value to the form its typed column expects, widening the column when the value does not fit.
+        Only empty values become None.
+        """
+        kind, sql_type = self.columnTypes[idx]
+        value = str(value).strip()
+        if value == '':
+            return None
+        # Severity and status values are folded to upper case whether or not the column is still an ENUM
+        if self.headers[idx].strip().lower() in ENUM_COLUMN_VALUES:
+            value = value.upper()
+        widened = None
+        if kind == 'enum':
+            if value not in self.enumMembers.get(self.headers[idx], ()):
+                # A value missing from the sampled members would be rejected, so the column becomes a string
+                widened = ('string', 'VARCHAR(255)')
+        elif kind == 'int':
+            if not INT_PATTERN.match(value) or abs(int(value)) > MAX_BIGINT:
+                widened = ('float', 'DOUBLE') if FLOAT_PATTERN.match(value) else ('string', 'VARCHAR(255)')
+            elif sql_type == 'INT' and abs(int(value)) > MAX_INT:
+                widened = ('int', 'BIGINT')
+        elif kind == 'float':
+            if not (INT_PATTERN.match(value) or FLOAT_PATTERN.match(value)):
+                widened = ('string', 'VARCHAR(255)')
+        elif kind in ('date', 'datetime'):
+            parsed = self.parse_datetime(value)
+            if parsed is None:
+                widened = ('string', 'VARCHAR(255)')
+            elif kind == 'date' and len(value) > 10:
+                # A timestamp in a DATE column would lose its time of day
+                widened = ('datetime', 'DATETIME')
+            else:
+                value = parsed.strftime('%Y-%m-%d' if kind == 'date' else '%Y-%m-%d %H:%M:%S')
+        elif kind == 'string':
+            if sql_type.startswith('VARCHAR(') and len(value) > int(sql_type[8:-1]):
+                widened = ('string', 'TEXT')
+            elif sql_type == 'TEXT' and len(value.encode('utf-8')) > MAX_TEXT_BYTES:
+                widened = ('string', 'MEDIUMTEXT')
+        if widened is not None:
+            self.widen_column(table, idx, *widened)
+            return self.convert_value(value, idx, table)
+        return value
+
+    def convert_row(self, row, table):
+        """
+        Converts the values of a padded row to the column types of the given table.
+        """
+        if self.columnTypes is None:
+            return row
+        return [self.convert_value(value, idx, table) for idx, value in enumerate(row)]
+
+    def iter_batches(self, rows):
+        """
+        Groups rows into lists of at most batchSize rows.
+        """
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batchSize:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def run_with_retry(self, query, chunk_number):
+        """
+        Runs the query for one chunk, retrying it with exponential backoff if it fails.
+        """
+        attempt = 1
+        while True:
+            try:
+                return self.run_query(query)
+            except Exception as e:
+                if attempt > self.chunkRetries:
+                    raise Exception(f'Chunk {chunk_number} failed after {attempt} attempts. Error: {str(e)}')
+                self.add_debug_log(f'Chunk {chunk_number} failed on attempt {attempt}, retrying. Error: {str(e)}')
+                time.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+                attempt += 1
+
+    def load_chunk(self, table, batch, chunk_number):
+        """
+        Inserts one chunk of rows and returns how many rows it held.
+        """
+        self.run_with_retry(self.build_insert_query(table, batch), chunk_number)
+        demisto.debug(f'Chunk {chunk_number} with {len(batch)} rows inserted into {table}.')
+        return len(batch)
+
+    def report_progress(self, table, imported, chunks):
+        """
+        Writes import progress to the debug log and, every progressInterval chunks, to the war room.
+        """
+        message = f'Imported {imported} rows into {table} in {chunks} chunks.'
+        demisto.debug(message)
+        if chunks % self.progressInterval == 0:
+            demisto.results(message)
+
+    def insert_rows(self, table):
+        """
+        Streams rows from the file into the table in chunks loaded by a small pool of workers.
+        """
+        imported = 0
+        chunks = 0
+        rows = (self.pad_row(row) for row in self.rows)
+        if self.rowHashes is not None:
+            # Hashes are taken over the raw values so they do not depend on the inferred types
+            rows = self.hash_rows(rows, self.rowHashes)
+        rows = (self.convert_row(row, table) for row in rows)
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        pending = set()
         try:
-            table_schema = self.get_table_schema()
-            demisto.executeCommand('asset-query-sql', {'query': table_schema})
-            self.add_debug_log(f'Table {self.tableName} schema created.')
+            for chunk_number, batch in enumerate(self.iter_batches(rows), start=1):
+                pending.add(executor.submit(self.load_chunk, table, batch, chunk_number))
+                # Only a couple of chunks per worker are held in memory at once
+                if len(pending) >= self.workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        imported += future.result()
+                        chunks += 1
+                        self.report_progress(table, imported, chunks)
+            for future in pending:
+                imported += future.result()
+                chunks += 1
+                self.report_progress(table, imported, chunks)
+        finally:
+            # A failed chunk stops the import, so chunks that have not started are dropped
+            executor.shutdown(wait=True, cancel_futures=True)
+        self.add_debug_log(f'Inserted {imported} rows into {table} in {chunks} chunks.')
+        return imported
+
+    def local_infile_enabled(self):
+        """
+        Checks whether the server accepts LOAD DATA LOCAL INFILE.
+        """
+        try:
+            res = self.run_query("SHOW VARIABLES LIKE 'local_infile'")
+            row = res[0]['Contents'][0]
+            value = row.get('Value') if isinstance(row, dict) else row[-1]
+            return str(value).upper() in ('ON', '1')
         except Exception as e:
-            self.add_debug_log(f'Failed to create table schema: {str(e)}')
-            demisto.return_error('Failed to create table schema.')
+            self.add_debug_log(f'Could not read local_infile setting: {str(e)}')
+            return False
+
+    def load_data_infile(self, table):
+        """
+        Loads the CSV file into the table with LOAD DATA LOCAL INFILE.
+        """
+        import_query = f"""
+            LOAD DATA LOCAL INFILE '{self.fileLocation}'
+            INTO TABLE {table}
+            FIELDS TERMINATED BY ','
+            ENCLOSED BY '"'
+            LINES TERMINATED BY '\\n'
+            IGNORE 1 ROWS;
+        """
+        self.run_query(import_query)
+
+    def uses_load_data(self):
+        """
+        Decides once whether the file is loaded with LOAD DATA instead of batched inserts.
+        """
+        if not hasattr(self, 'useLoadData'):
+            # LOAD DATA can only read the original file, so it is limited to CSV uploads
+            self.useLoadData = self.extension == 'csv' and (
+                self.importMethod == 'loadData'
+                or (self.importMethod == 'auto' and self.local_infile_enabled())
+            )
+        return self.useLoadData
+
+    def import_data(self, table):
+        """
+        Imports data into the given SQL table and returns the number of rows sent, if known.
+        """
+        if self.uses_load_data():
+            self.load_data_infile(table)
+            self.add_debug_log(f'Loaded table {table} with LOAD DATA from {self.fileLocation}.')
+            return None
+        imported = self.insert_rows(table)
+        self.add_debug_log(f'Updated table {table} with {imported} rows from {self.fileName}.')
+        return imported
+
+    def validate_import(self, table, imported):
+        """
+        Checks the loaded table holds every row that was sent before it is swapped in.
+        """
+        loaded = self.count_rows(table)
+        if imported is not None and loaded != imported:
+            raise Exception(f'Table {table} has {loaded} rows but {imported} were imported.')
+        if loaded == 0 and not self.allowEmpty:
+            raise Exception(f'Table {table} is empty; set allowEmpty=true to replace {self.tableName} with an empty table.')
+        self.add_debug_log(f'Validated {loaded} rows in {table}.')
 
-    def import_data(self):
+    def swap_tables(self, shadow_table, live_table=None):
         """
-        Imports data into the SQL table.
+        Atomically replaces the live table with the shadow table using RENAME TABLE.
         """
+        live_table = live_table or self.tableName
+        old_table = f'{live_table}{OLD_SUFFIX}'
+        if self.table_exists(live_table):
+            self.remove_table(old_table)
+            self.run_query(f'RENAME TABLE {live_table} TO {old_table}, {shadow_table} TO {live_table}')
+            self.remove_table(old_table)
+        else:
+            self.run_query(f'RENAME TABLE {shadow_table} TO {live_table}')
+        self.add_debug_log(f'Swapped {shadow_table} in as {live_table}.')
+
+    def import_with_swap(self):
+        """
+        Loads the file into a shadow table and swaps it in, leaving the live table untouched on failure.
+        """
+        shadow_table = f'{self.tableName}{SHADOW_SUFFIX}'
         try:
-            demisto.executeCommand('asset-query-sql', {'query': 'SET GLOBAL local_infile = 1'})
-            self.add_debug_log('Enabled local_infile for SQL.')
+            self.remove_table(shadow_table)
+            self.build_table(shadow_table)
+            imported = self.import_data(shadow_table)
+            self.create_indexes(shadow_table)
+            self.validate_import(shadow_table, imported)
+            self.swap_tables(shadow_table)
         except Exception as e:
-            self.add_debug_log(f'Failed to enable local_infile: {str(e)}')
+            self.add_debug_log(f'Import into {shadow_table} failed; {self.tableName} was left unchanged. Error: {str(e)}')
+            self.remove_table(shadow_table)
+            demisto.return_error(f'Failed to update table {self.tableName}. Error: {str(e)}')
+        if self.rowHashes is not None:
+            try:
+                self.save_row_hashes()
+            except Exception as e:
+                # The live table is already swapped in; without an index the next delta run does a full import
+                self.add_debug_log(f'{self.tableName} was updated but its row hash index could not be saved. Error: {str(e)}')
+                self.remove_table(self.hashTable)
+
+    def import_with_replace(self):
+        """
+        Drops the live table and loads the file into it directly.
+        """
         try:
-            import_query = f"""
-                LOAD DATA LOCAL INFILE '{self.fileLocation}'
-                INTO TABLE {self.tableName}
-                FIELDS TERMINATED BY ','
-                ENCLOSED BY '"'
-                LINES TERMINATED BY '\\n'
-                IGNORE 1 ROWS;
-            """
-            demisto.executeCommand('asset-query-sql', {'query': import_query})
-            self.add_debug_log(f'Updated table {self.tableName} with data from {self.fileLocation}.')
+            self.remove_table(self.tableName)
+            self.build_table(self.tableName)
+            self.import_data(self.tableName)
+            self.create_indexes(self.tableName)
         except Exception as e:
             self.add_debug_log(f'Failed to update table {self.tableName}. Error: {str(e)}')
             demisto.return_error(f'Failed to update table {self.tableName}. Error: {str(e)}')
 
+    def find_key_index(self):
+        """
+        Returns the position of the primary key column used for delta imports.
+        """
+        lowered = [header.strip().lower() for header in self.headers]
+        candidates = [self.keyColumn] if self.keyColumn else KEY_COLUMN_CANDIDATES
+        for candidate in candidates:
+            if candidate.strip().lower() in lowered:
+                return lowered.index(candidate.strip().lower())
+        raise Exception(f'Key column {", ".join(candidates)} not found in {self.fileName}.')
+
+    def hash_rows(self, rows, row_hashes):
+        """
+        Passes rows through while recording the hash of each row under its key.
+        """
+        for row in rows:
+            key = str(row[self.keyIndex])
+            # Like apply_delta, only the first row of a duplicate key is kept
+            if key in row_hashes:
+                continue
+            row_hashes[key] = self.row_hash(row)
+            yield row
+
+    @staticmethod
+    def row_hash(row):
+        """
+        Hashes a padded row so unchanged findings can be recognized between imports.
+        """
+        return hashlib.md5('\x1f'.join(str(value) for value in row).encode('utf-8')).hexdigest()
+
+    def load_row_hashes(self):
+        """
+        Reads the stored key to row hash index of the live table.
+        """
+        res = self.run_query(f'SELECT row_key, row_hash FROM {self.hashTable}')
+        contents = res[0].get('Contents')
+        stored = {}
+        if isinstance(contents, list):
+            for row in contents:
+                if isinstance(row, dict):
+                    stored[str(row['row_key'])] = row['row_hash']
+                else:
+                    stored[str(row[0])] = row[1]
+        return stored
+
+    def save_row_hashes(self):
+        """
+        Rebuilds the row hash index from the hashes recorded during a full import.
+        """
+        shadow_table = f'{self.hashTable}{SHADOW_SUFFIX}'
+        self.remove_table(shadow_table)
+        self.create_hash_table(shadow_table)
+        for batch in self.iter_batches(self.rowHashes.items()):
+            self.run_query(self.build_insert_query(shadow_table, batch, ['row_key', 'row_hash']))
+        self.swap_tables(shadow_table, self.hashTable)
+        self.add_debug_log(f'Stored {len(self.rowHashes)} row hashes in {self.hashTable}.')
+
+    def table_columns(self, table):
+        """
+        Returns the name and MySQL type of each column of the given SQL table in order.
+        """
+        res = self.run_query(f'SHOW COLUMNS FROM {table}')
+        contents = res[0].get('Contents')
+        columns = []
+        if isinstance(contents, list):
+            for row in contents:
+                if isinstance(row, dict):
+                    columns.append((str(row['Field']), str(row['Type'])))
+                else:
+                    columns.append((str(row[0]), str(row[1])))
+        return columns
+
+    def parse_column_type(self, header, sql_type):
+        """
+        Maps a column type reported by MySQL back to the kind and type used for conversion.
+        """
+        lowered = sql_type.lower()
+        if lowered.startswith('enum('):
+            members = [member.replace("''", "'") for member in re.findall(r"'((?:[^']|'')*)'", sql_type)]
+            self.enumMembers[header] = set(members)
+            return 'enum', sql_type
+        if lowered.startswith('bigint'):
+            return 'int', 'BIGINT'
+        if lowered.startswith('int'):
+            return 'int', 'INT'
+        if lowered.startswith('double'):
+            return 'float', 'DOUBLE'
+        if lowered.startswith('datetime'):
+            return 'datetime', 'DATETIME'
+        if lowered.startswith('date'):
+            return 'date', 'DATE'
+        return 'string', sql_type.upper()
+
+    def create_hash_table(self, table):
+        """
+        Creates the companion table that holds one hash per primary key.
+        """
+        self.run_query(
+            f'CREATE TABLE {table} (row_key VARCHAR(255) NOT NULL PRIMARY KEY, row_hash CHAR(32) NOT NULL)'
+        )
+
+    def delete_keys(self, table, key_column, keys):
+        """
+        Deletes the rows of the given keys in batches.
+        """
+        for batch in self.iter_batches(keys):
+            key_list = ', '.join(self.sql_literal(key) for key in batch)
+            self.run_query(f'DELETE FROM {table} WHERE `{key_column}` IN ({key_list})')
+
+    def apply_delta(self, stored):
+        """
+        Compares each row with the stored hashes and writes only new, changed and removed findings.
+        """
+        key_column = self.headers[self.keyIndex]
+        seen = {}
+        inserts, updates = [], []
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'duplicates': 0}
+
+        def flush(pending, changed):
+            keys = [key for key, row in pending]
+            if changed:
+                # Changed findings are replaced: their old row and hash are removed first
+                self.delete_keys(self.tableName, key_column, keys)
+                self.delete_keys(self.hashTable, 'row_key', keys)
+            self.run_with_retry(self.build_insert_query(self.tableName, [row for key, row in pending]), 'delta')
+            hash_rows = [(key, seen[key]) for key in keys]
+            self.run_with_retry(self.build_insert_query(self.hashTable, hash_rows, ['row_key', 'row_hash']), 'delta')
+            pending.clear()
+
+        for row in self.rows:
+            row = self.pad_row(row)
+            key = str(row[self.keyIndex])
+            if key in seen:
+                counts['duplicates'] += 1
+                continue
+            seen[key] = self.row_hash(row)
+            if key not in stored:
+                inserts.append((key, self.convert_row(row, self.tableName)))
+                counts['inserted'] += 1
+                if len(inserts) >= self.batchSize:
+                    flush(inserts, False)
+            elif stored[key] != seen[key]:
+                updates.append((key, self.convert_row(row, self.tableName)))
+                counts['updated'] += 1
+                if len(updates) >= self.batchSize:
+                    flush(updates, True)
+            else:
+                counts['unchanged'] += 1
+        if inserts:
+            flush(inserts, False)
+        if updates:
+            flush(updates, True)
+
+        removed = [key for key in stored if key not in seen]
+        self.delete_keys(self.tableName, key_column, removed)
+        self.delete_keys(self.hashTable, 'row_key', removed)
+        counts['deleted'] = len(removed)
+        return counts
+
+    def import_with_delta(self):
+        """
+        Applies only the differences between the file and the live table, keyed by finding ID.
+        """
+        self.hashTable = f'{self.tableName}{HASH_SUFFIX}'
+        try:
+            self.keyIndex = self.find_key_index()
+        except Exception as e:
+            self.add_debug_log(str(e))
+            demisto.return_error(str(e))
+        # Row hashes are collected while streaming, so delta imports always use batched inserts
+        self.importMethod = 'insert'
+        if not (self.table_exists(self.tableName) and self.table_exists(self.hashTable)):
+            self.add_debug_log(f'No row hash index for {self.tableName}; running a full import.')
+            self.import_full_after_delta()
+            return
+        live_columns = self.table_columns(self.tableName)
+        if [name.lower() for name, sql_type in live_columns] != [header.lower() for header in self.headers]:
+            self.add_debug_log(f'Columns of {self.fileName} do not match {self.tableName}; running a full import.')
+            self.import_full_after_delta()
+            return
+        try:
+            # Values are converted to the live column types, which earlier imports may have widened
+            self.columnTypes = [self.parse_column_type(header, sql_type) for header, (name, sql_type) in zip(self.headers, live_columns)]
+            counts = self.apply_delta(self.load_row_hashes())
+            self.add_debug_log(
+                f"Delta applied to {self.tableName}: {counts['inserted']} inserted, {counts['updated']} updated, "
+                f"{counts['deleted']} deleted, {counts['unchanged']} unchanged, {counts['duplicates']} duplicate keys skipped."
+            )
+        except Exception as e:
+            # A partial delta can leave changed findings deleted, so the whole file is reloaded instead
+            self.add_debug_log(f'Delta import into {self.tableName} failed; running a full import. Error: {str(e)}')
+            self.open_file()
+            self.import_full_after_delta()
+
+    def import_full_after_delta(self):
+        """
+        Replaces the live table through a shadow table and rebuilds the row hash index from the same file.
+        """
+        self.remove_table(self.hashTable)
+        self.columnTypes = None
+        self.enumMembers = {}
+        self.rowHashes = {}
+        self.import_with_swap()
+
     def record_count(self):
         """
         Counts the total number of records in the SQL table.
         """
         try:
-            self.totalRecords = demisto.executeCommand('asset-query-sql', {'query': f'SELECT COUNT(*) FROM {self.tableName}'})
-            self.total = self.totalRecords[0]['Contents'][0]
+            self.total = self.count_rows(self.tableName)
             self.add_debug_log(f'Total records in table {self.tableName}: {self.total}')
         except Exception as e:
             self.add_debug_log(f'Failed to get total records: {str(e)}')
@@ -167,14 +822,15 @@ class DataImporter:
         Executes the data import process.
         """
         self.fetch_args()
-        self.remove_table()
         self.process_entry_id()
         self.process_file_extension()
         self.open_file()
-        self.process_wiz_report()
-        self.save_file()
-        self.build_table()
-        self.import_data()
+        if self.importMode == 'replace':
+            self.import_with_replace()
+        elif self.importMode == 'delta':
+            self.import_with_delta()
+        else:
+            self.import_with_swap()
         self.record_count()
         self.output_results()
 
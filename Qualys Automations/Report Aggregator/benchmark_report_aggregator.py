@@ -0,0 +1,181 @@
+# Benchmark for report_aggregator.py
+# Generates a synthetic YYYY-MM folder tree of workbooks and times each pipeline stage.
+# Example: python benchmark_report_aggregator.py --files 40 --rows 2000 --engines openpyxl,calamine
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import openpyxl
+import pandas as pd
+
+# report_aggregator builds its placeholder paths from USERPROFILE at import time
+os.environ.setdefault('USERPROFILE', os.path.expanduser('~'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import report_aggregator
+
+SOURCES = ['techeol', 'streamingeol']
+BASE_COLUMNS = ['Asset Name', 'IP Address', 'Product', 'Version', 'Vendor', 'EOL Date', 'Owner', 'Business Unit',
+                'Environment', 'Location', 'Status', 'Notes']
+STAGES = ['walk', 'copy', 'unhide', 'parse', 'concat']
+
+def previous_months(match_format, count):
+    year, month = (int(part) for part in match_format.split('-'))
+    months = []
+    for _ in range(count):
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+        months.append(f"{year:04d}-{month:02d}")
+    return months
+
+def write_workbook(file_path, columns, rows, hidden_rows, hidden_cols, seed):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = 'sheet1'
+    sheet.append(columns)
+    for row in range(rows):
+        sheet.append([f"{col}-{seed}-{row}" if col_idx % 3 else row for col_idx, col in enumerate(columns)])
+    for row in range(2, 2 + min(hidden_rows, rows)):
+        sheet.row_dimensions[row].hidden = True
+    for col_idx in range(max(len(columns) - hidden_cols, 0), len(columns)):
+        sheet.column_dimensions[openpyxl.utils.get_column_letter(col_idx + 1)].hidden = True
+    workbook.save(file_path)
+
+def generate_workbooks(root_dir, match_format, file_count, rows, columns, hidden_rows, hidden_cols, drift_every,
+                       other_months, teams):
+    # Layout: <root>/<source>/<team>/<year>/<YYYY-MM>/report_<n>.xlsx, plus decoy months for pruning
+    months = [match_format] + previous_months(match_format, other_months)
+    file_paths = []
+    for index in range(file_count):
+        source = SOURCES[index % len(SOURCES)]
+        team = f"team_{index % teams}"
+        folder = os.path.join(root_dir, source, team, match_format[:4], match_format)
+        os.makedirs(folder, exist_ok=True)
+        workbook_columns = BASE_COLUMNS[:columns] + [f"Extra {col}" for col in range(max(columns - len(BASE_COLUMNS), 0))]
+        if drift_every and index % drift_every == 0:
+            # Schema drift: a renamed column and a column only some workbooks carry
+            workbook_columns = workbook_columns[:-1] + [f"{workbook_columns[-1]} (renamed)", f"Drift {index}"]
+        file_path = os.path.join(folder, f"report_{index}.xlsx")
+        write_workbook(file_path, workbook_columns, rows, hidden_rows, hidden_cols, index)
+        file_paths.append(file_path)
+    # One small workbook per decoy month; discovery should never reach them
+    for month in months[1:]:
+        folder = os.path.join(root_dir, SOURCES[0], 'team_0', month[:4], month)
+        os.makedirs(folder, exist_ok=True)
+        write_workbook(os.path.join(folder, 'decoy.xlsx'), BASE_COLUMNS[:columns], 1, 0, 0, 0)
+    return file_paths
+
+def measure(stage_results, stage, trace_memory, func, *args):
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        stage_results.setdefault(stage, {})['peak_mb'] = peak / (1024 * 1024)
+    else:
+        stage_results.setdefault(stage, {})['seconds'] = elapsed
+    return result
+
+def run_pipeline(root_dir, local_dir, match_format, engine, read_in_place, trace_memory, stage_results):
+    shutil.rmtree(local_dir, ignore_errors=True)
+    os.makedirs(local_dir)
+    report_aggregator.EXCEL_ENGINE = engine
+    report_aggregator.READ_IN_PLACE = read_in_place
+
+    root_dirs = [os.path.join(root_dir, source) for source in SOURCES]
+    folders = measure(stage_results, 'walk', trace_memory, report_aggregator.get_all_matching_folders, root_dirs,
+                      match_format)
+
+    def copy_stage():
+        return [report_aggregator.copy_files_to_local(df, local_dir) for df in folders]
+    staged = measure(stage_results, 'copy', trace_memory, copy_stage)
+    staged_paths = [path for df in staged for path, staged_copy in zip(df['Local Copy Paths'], df['Staged Copy'])
+                    if staged_copy]
+    all_paths = [path for df in staged for path in df['Local Copy Paths']]
+
+    def unhide_stage():
+        for path in staged_paths:
+            report_aggregator.unhide_hidden(path)
+    measure(stage_results, 'unhide', trace_memory, unhide_stage)
+
+    def parse_stage():
+        return [report_aggregator.validate_excel_file(path, 'sheet1') for path in all_paths]
+    frames = measure(stage_results, 'parse', trace_memory, parse_stage)
+
+    def concat_stage():
+        non_empty = [frame for frame in frames if not frame.empty]
+        return pd.concat(non_empty, ignore_index=True, sort=False) if non_empty else pd.DataFrame()
+    union_all = measure(stage_results, 'concat', trace_memory, concat_stage)
+    return len(all_paths), len(union_all)
+
+def print_table(results):
+    headers = ['Option', 'Files', 'Rows'] + [f"{stage} (s)" for stage in STAGES] + ['Total (s)'] + \
+              [f"{stage} (MB)" for stage in STAGES]
+    lines = []
+    for option, (files, rows, stage_results) in results.items():
+        seconds = [stage_results.get(stage, {}).get('seconds', 0.0) for stage in STAGES]
+        peaks = [stage_results.get(stage, {}).get('peak_mb') for stage in STAGES]
+        lines.append([option, str(files), str(rows)] + [f"{value:.3f}" for value in seconds] +
+                     [f"{sum(seconds):.3f}"] + ['-' if value is None else f"{value:.1f}" for value in peaks])
+    widths = [max(len(row[idx]) for row in [headers] + lines) for idx in range(len(headers))]
+    print(' | '.join(header.ljust(width) for header, width in zip(headers, widths)))
+    print('-+-'.join('-' * width for width in widths))
+    for line in lines:
+        print(' | '.join(value.ljust(width) for value, width in zip(line, widths)))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the report_aggregator pipeline on synthetic workbooks.')
+    parser.add_argument('--files', type=int, default=20, help='Number of workbooks to generate.')
+    parser.add_argument('--rows', type=int, default=1000, help='Data rows per workbook.')
+    parser.add_argument('--columns', type=int, default=10, help='Columns per workbook.')
+    parser.add_argument('--hidden-rows', type=int, default=10, help='Hidden rows per workbook.')
+    parser.add_argument('--hidden-cols', type=int, default=2, help='Hidden columns per workbook.')
+    parser.add_argument('--drift-every', type=int, default=5, help='Add schema drift to every Nth workbook (0 disables).')
+    parser.add_argument('--other-months', type=int, default=3, help='Decoy month folders that discovery should prune.')
+    parser.add_argument('--teams', type=int, default=4, help='Team folders per source root.')
+    parser.add_argument('--engines', default='openpyxl', help='Comma-separated pandas Excel engines to compare.')
+    parser.add_argument('--workdir', default=None, help='Directory for the generated tree (defaults to a temp dir).')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc pass for peak memory.')
+    parser.add_argument('--keep', action='store_true', help='Keep the generated files after the run.')
+    args = parser.parse_args()
+
+    work_dir = args.workdir or tempfile.mkdtemp(prefix='report_aggregator_bench_')
+    root_dir = os.path.join(work_dir, 'tree')
+    local_dir = os.path.join(work_dir, 'local')
+    match_format = datetime.now().strftime('%Y-%m')
+
+    try:
+        start = time.perf_counter()
+        file_paths = generate_workbooks(root_dir, match_format, args.files, args.rows, args.columns, args.hidden_rows,
+                                        args.hidden_cols, args.drift_every, args.other_months, args.teams)
+        print(f"Generated {len(file_paths)} workbooks in {time.perf_counter() - start:.2f}s under {root_dir}")
+
+        results = {}
+        for engine in [engine.strip() for engine in args.engines.split(',') if engine.strip()]:
+            for read_in_place in (False, True):
+                option = f"{engine}, {'in place' if read_in_place else 'staged'}"
+                stage_results = {}
+                try:
+                    files, rows = run_pipeline(root_dir, local_dir, match_format, engine, read_in_place, False,
+                                               stage_results)
+                    if not args.no_memory:
+                        run_pipeline(root_dir, local_dir, match_format, engine, read_in_place, True, stage_results)
+                    results[option] = (files, rows, stage_results)
+                except Exception as e:
+                    print(f"Error while benchmarking option: {option}")
+                    print(f"Error message: {str(e)}")
+        print_table(results)
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,14 @@
-import Alteryx
 import ctypes
 import os
 import shutil
 import pandas as pd
 import openpyxl
 import glob
+import hashlib
+import json
+import re
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 # For file locking in Windows
@@ -25,20 +28,52 @@ def unlock_file(fd):
 # New base directories (Replaced with placeholders for organizational paths)
 root_dir_techeol = os.path.join(os.getenv('USERPROFILE'), "{ORGANIZATION_PATH_1}")
 root_dir_streamingeol = os.path.join(os.getenv('USERPROFILE'), "{ORGANIZATION_PATH_2}")
+LOCAL_COPY_DIR = os.path.join(os.getenv('USERPROFILE'), "{LOCAL_COPY_DIR}")
 
-def get_matching_folders(root_dir, match_format):
+# pandas engine used to parse workbooks ('openpyxl', or 'calamine' with python-calamine installed)
+EXCEL_ENGINE = 'openpyxl'
+
+# Date-named folders sit within this many levels of each root directory
+MAX_FOLDER_DEPTH = 4
+# A standalone YYYY-MM with a real month, so names like "FY 2024-25" or "2023-2024" are not taken for dates
+date_folder_pattern = re.compile(r'(?<!\d)\d{4}-(0[1-9]|1[0-2])(?!\d)')
+
+def scan_matching_folders(root_dir, match_format, max_depth=MAX_FOLDER_DEPTH):
     matching_folders = []
-    for root, dirs, files in os.walk(root_dir):
-        for dir in dirs:
-            if match_format in dir:
-                matching_folders.append(os.path.join(root, dir))
+    pending_dirs = [(root_dir, 0)]
+    while pending_dirs:
+        current_dir, depth = pending_dirs.pop()
+        try:
+            with os.scandir(current_dir) as entries:
+                for entry in entries:
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                    if match_format in entry.name:
+                        matching_folders.append(entry.path)
+                    elif date_folder_pattern.search(entry.name):
+                        # Folders dated for another month never hold this month's reports
+                        continue
+                    if depth + 1 < max_depth:
+                        pending_dirs.append((entry.path, depth + 1))
+        except OSError as e:
+            print(f"Error while scanning folder: {current_dir}")
+            print(f"Error message: {str(e)}")
+    return sorted(matching_folders)
+
+def get_matching_folders(root_dir, match_format):
+    matching_folders = scan_matching_folders(root_dir, match_format)
     # Returns a DataFrame
     return pd.DataFrame(matching_folders, columns=['Matching Folder Paths'])
 
+def get_all_matching_folders(root_dirs, match_format):
+    # Scan every root at the same time; synced network trees are I/O bound
+    with ThreadPoolExecutor(max_workers=len(root_dirs)) as executor:
+        return list(executor.map(lambda root_dir: get_matching_folders(root_dir, match_format), root_dirs))
+
 def validate_excel_file(file_path, sheet_name):
     try:
         actual_file_path = ensure_read_access(file_path)
-        xls = pd.ExcelFile(actual_file_path, engine='openpyxl')
+        xls = pd.ExcelFile(actual_file_path, engine=EXCEL_ENGINE)
         
         if sheet_name in xls.sheet_names:
             data = pd.read_excel(xls, sheet_name=sheet_name)
@@ -69,104 +104,248 @@ def unhide_hidden(file_path):
         print(f"Error message: {str(e)}")
         pass
 
+# Readable workbooks are parsed where they sit instead of being copied locally
+READ_IN_PLACE = True
+# Number of concurrent copies when workbooks do need staging
+COPY_WORKERS = 8
+STAGING_MANIFEST = "staging_manifest.json"
+
+def staged_file_name(file_path):
+    # Prefix with a digest of the source folder so same-named workbooks never collide
+    folder_digest = hashlib.md5(os.path.dirname(os.path.abspath(file_path)).encode('utf-8')).hexdigest()[:8]
+    return f"{folder_digest}_{os.path.basename(file_path)}"
+
+def file_signature(file_path):
+    file_stat = os.stat(file_path)
+    return [file_stat.st_size, file_stat.st_mtime]
+
+def stage_copy(file_path, staged_path):
+    try:
+        if os.path.exists(staged_path) and file_signature(staged_path) == file_signature(file_path):
+            return staged_path
+    except OSError:
+        pass
+    shutil.copy2(file_path, staged_path)
+    return staged_path
+
 def ensure_read_access(file_path):
     if os.access(file_path, os.R_OK):
         return file_path
     else:
-        temp_dir = tempfile.gettempdir()
-        temp_file_path = os.path.join(temp_dir, os.path.basename(file_path))
-        shutil.copy2(file_path, temp_file_path)
-        return temp_file_path
+        temp_file_path = os.path.join(tempfile.gettempdir(), staged_file_name(file_path))
+        return stage_copy(file_path, temp_file_path)
 
 def ensure_write_access(file_path):
     if os.access(file_path, os.W_OK):
         return file_path
     else:
-        temp_dir = tempfile.gettempdir()
-        temp_file_path = os.path.join(temp_dir, os.path.basename(file_path))
-        shutil.copy2(file_path, temp_file_path)
-        return temp_file_path
+        temp_file_path = os.path.join(tempfile.gettempdir(), staged_file_name(file_path))
+        return stage_copy(file_path, temp_file_path)
 
-def union_all_excel_files(df):
-    all_data = pd.DataFrame()
+def iter_excel_files(df):
     target_sheet = "sheet1"
     temp_files = []
     try:
-        for path in df['Local Copy Paths']:
+        for path, staged_copy in zip(df['Local Copy Paths'], df['Staged Copy']):
             files = glob.glob(path)
             for file in files:
                 if file.endswith('.xlsx'):
                     lock_fd = None
+                    data = pd.DataFrame()
                     try:
-                        lock_fd = lock_file(file)
-                        temp_files.append(file)
-                        unhide_hidden(file)
+                        # Only staged copies are locked and rewritten; originals are read as-is
+                        if staged_copy:
+                            lock_fd = lock_file(file)
+                            temp_files.append(file)
+                            unhide_hidden(file)
                         data = validate_excel_file(file, target_sheet)
-                        if not data.empty:
-                            if all_data.empty:
-                                all_data = data
-                            else:
-                                all_data = pd.concat([all_data, data], ignore_index=True, sort=False)
                     except Exception as e:
                         print(f"Error while processing file: {file}") 
                         print(f"Error message: {str(e)}")
                     finally:
                         if lock_fd:
                             unlock_file(lock_fd)
+                    if not data.empty:
+                        yield file, data
     finally:
         for temp_file in temp_files:
-            temp_path = os.path.join(tempfile.gettempdir(), os.path.basename(temp_file))
+            temp_path = os.path.join(tempfile.gettempdir(), staged_file_name(temp_file))
             if os.path.exists(temp_path):
                 os.remove(temp_path)
-    return all_data
 
-def copy_files_to_local(df):
-    local_paths = []
-    local_dir = os.path.join(os.getenv('USERPROFILE'), "{LOCAL_COPY_DIR}")
+def union_all_excel_files(df):
+    frames = [data for file, data in iter_excel_files(df)]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True, sort=False)
+
+# Set to True to stream each workbook into a partitioned Parquet dataset instead of one in-memory union
+EXPORT_PARQUET = False
+PARQUET_OUTPUT_DIR = os.path.join(os.getenv('USERPROFILE'), "{PARQUET_OUTPUT_DIR}")
+COLUMN_REGISTRY_FILE = "_columns.json"
+COMMON_METADATA_FILE = "_common_metadata"
+PARTITION_COLUMNS = ['source', 'month']
+
+def load_column_registry(output_dir):
+    try:
+        with open(os.path.join(output_dir, COLUMN_REGISTRY_FILE), 'r') as registry_file:
+            return json.load(registry_file)
+    except (OSError, ValueError):
+        return {}
+
+def save_column_registry(output_dir, column_registry):
+    with open(os.path.join(output_dir, COLUMN_REGISTRY_FILE), 'w') as registry_file:
+        json.dump(column_registry, registry_file, indent=2)
+
+def unify_columns(data, column_registry):
+    data.columns = [str(col) for col in data.columns]
+    for col in data.columns:
+        if col not in column_registry:
+            column_registry[col] = 'string'
+    # Parts written before a column first appears lack it; write_common_metadata records the full schema
+    return data.reindex(columns=list(column_registry)).fillna('').astype(str)
+
+def common_schema(column_registry):
+    import pyarrow as pa
+    return pa.schema([(col, pa.string()) for col in column_registry] +
+                     [(col, pa.string()) for col in PARTITION_COLUMNS if col not in column_registry])
+
+def write_common_metadata(output_dir, column_registry):
+    # The dataset-wide schema: every registered column plus the partition columns, all as strings
+    import pyarrow.parquet as pq
+    pq.write_metadata(common_schema(column_registry), os.path.join(output_dir, COMMON_METADATA_FILE))
+
+def read_parquet_dataset(output_dir):
+    # Reads every part with the common schema, so columns missing from older parts come back as nulls
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    schema = pq.read_schema(os.path.join(output_dir, COMMON_METADATA_FILE))
+    dataset = ds.dataset(output_dir, format='parquet', partitioning='hive', schema=schema)
+    return dataset.to_table().to_pandas()
+
+def export_excel_files_to_parquet(df, output_dir, source_name, month, column_registry):
+    partition_dir = os.path.join(output_dir, f"source={source_name}", f"month={month}")
+    if not os.path.exists(partition_dir):
+        os.makedirs(partition_dir)
+    parts = []
+    for file, data in iter_excel_files(df):
+        part_path = os.path.join(partition_dir, os.path.splitext(staged_file_name(file))[0] + '.parquet')
+        try:
+            unify_columns(data, column_registry).to_parquet(part_path, index=False)
+            parts.append((part_path, len(data)))
+            print(f"Wrote {len(data)} rows to: {part_path}")
+        except Exception as e:
+            print(f"Error while writing parquet file: {part_path}")
+            print(f"Error message: {str(e)}")
+    return parts
+
+def load_staging_manifest(local_dir):
+    try:
+        with open(os.path.join(local_dir, STAGING_MANIFEST), 'r') as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return {}
+
+def save_staging_manifest(local_dir, manifest):
+    try:
+        with open(os.path.join(local_dir, STAGING_MANIFEST), 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+    except OSError as e:
+        print(f"Error while saving staging manifest in: {local_dir}")
+        print(f"Error message: {str(e)}")
+
+def copy_files_to_local(df, local_dir=LOCAL_COPY_DIR):
     if not os.path.exists(local_dir):
         os.makedirs(local_dir)
-    
+    # Source size and mtime recorded per staged copy; staged copies are rewritten by unhide_hidden
+    manifest = load_staging_manifest(local_dir)
+
+    source_files = []
     for path in df['Matching Folder Paths']:
         files = glob.glob(os.path.join(path, "*.xlsx"))
         for file in files:
             if file.endswith('.xlsx'):
-                local_file_path = os.path.join(local_dir, os.path.basename(file))
+                source_files.append(file)
+
+    def stage_file(file):
+        if READ_IN_PLACE and os.access(file, os.R_OK):
+            return file, False, None, None
+        try:
+            staged_name = staged_file_name(file)
+            local_file_path = os.path.join(local_dir, staged_name)
+            signature = file_signature(file)
+            if manifest.get(staged_name) != signature or not os.path.exists(local_file_path):
                 shutil.copy2(file, local_file_path)
-                local_paths.append(local_file_path)
-    
-    return pd.DataFrame(local_paths, columns=['Local Copy Paths'])
-
-# Hardcoded date example
-# Example match_format for testing: match_format = "2024-07"
-
-try:
-    now = datetime.now()
-    print(f"Datetime.now function value: {now}.")
-    if 1 <= now.day <= 5:
-        first_day_of_current_month = now.replace(day=1)
-        last_day_of_previous_month = first_day_of_current_month - timedelta(days=1)
-        match_format = last_day_of_previous_month.strftime('%Y-%m')
-    else:
-        match_format = now.strftime('%Y-%m')
-except Exception as e:
-    match_format = "2024-08"
-    print(f"Error occurred: {str(e)}")
+            return local_file_path, True, staged_name, signature
+        except OSError as e:
+            print(f"Error while copying file: {file}")
+            print(f"Error message: {str(e)}")
+            return None
 
-print(match_format)
+    local_paths = []
+    with ThreadPoolExecutor(max_workers=COPY_WORKERS) as executor:
+        for staged in executor.map(stage_file, source_files):
+            if staged is None:
+                continue
+            local_file_path, staged_copy, staged_name, signature = staged
+            if staged_copy:
+                manifest[staged_name] = signature
+            local_paths.append((local_file_path, staged_copy))
+    save_staging_manifest(local_dir, manifest)
+
+    return pd.DataFrame(local_paths, columns=['Local Copy Paths', 'Staged Copy'])
+
+def get_match_format():
+    # Hardcoded date example
+    # Example match_format for testing: match_format = "2024-07"
+    try:
+        now = datetime.now()
+        print(f"Datetime.now function value: {now}.")
+        if 1 <= now.day <= 5:
+            first_day_of_current_month = now.replace(day=1)
+            last_day_of_previous_month = first_day_of_current_month - timedelta(days=1)
+            match_format = last_day_of_previous_month.strftime('%Y-%m')
+        else:
+            match_format = now.strftime('%Y-%m')
+    except Exception as e:
+        match_format = "2024-08"
+        print(f"Error occurred: {str(e)}")
+    return match_format
 
-df_techeol = get_matching_folders(root_dir_techeol, match_format)
-df_streamingeol = get_matching_folders(root_dir_streamingeol, match_format)
+def main():
+    # Only available inside the Alteryx Python tool
+    import Alteryx
 
-df_techeol_local = copy_files_to_local(df_techeol)
-df_streamingeol_local = copy_files_to_local(df_streamingeol)
+    match_format = get_match_format()
+    print(match_format)
+
+    df_techeol, df_streamingeol = get_all_matching_folders([root_dir_techeol, root_dir_streamingeol], match_format)
+
+    df_techeol_local = copy_files_to_local(df_techeol)
+    df_streamingeol_local = copy_files_to_local(df_streamingeol)
+
+    if EXPORT_PARQUET:
+        if not os.path.exists(PARQUET_OUTPUT_DIR):
+            os.makedirs(PARQUET_OUTPUT_DIR)
+        column_registry = load_column_registry(PARQUET_OUTPUT_DIR)
+        parts = export_excel_files_to_parquet(df_techeol_local, PARQUET_OUTPUT_DIR, 'techeol', match_format, column_registry)
+        parts += export_excel_files_to_parquet(df_streamingeol_local, PARQUET_OUTPUT_DIR, 'streamingeol', match_format, column_registry)
+        save_column_registry(PARQUET_OUTPUT_DIR, column_registry)
+        write_common_metadata(PARQUET_OUTPUT_DIR, column_registry)
+        print(list(column_registry))
+
+        Alteryx.write(pd.DataFrame(parts, columns=['Parquet File', 'Rows']), 1)
+    else:
+        union_df_techeol_local = union_all_excel_files(df_techeol_local)
+        union_df_streamingeol_local = union_all_excel_files(df_streamingeol_local)
 
-union_df_techeol_local = union_all_excel_files(df_techeol_local)
-union_df_streamingeol_local = union_all_excel_files(df_streamingeol_local)
+        union_all = pd.concat([union_df_techeol_local, union_df_streamingeol_local], ignore_index=True, sort=False)
+        print(union_all.columns.tolist())
 
-union_all = pd.concat([union_df_techeol_local, union_df_streamingeol_local], ignore_index=True, sort=False)
-print(union_all.columns.tolist())
+        union_all = union_all.fillna('')
+        union_all.columns = [str(col) for col in union_all.columns]
 
-union_all = union_all.fillna('')
-union_all.columns = [str(col) for col in union_all.columns]
+        Alteryx.write(union_all, 1)
 
-Alteryx.write(union_all, 1)
+if __name__ == '__main__':
+    main()